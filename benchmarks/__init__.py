@@ -0,0 +1,9 @@
+""" Benchmarks of launchalyzer's parsing / evaluation / visualization pipeline.
+
+Run from the repository root with:
+
+    python2 -m benchmarks.run -o results.json
+
+Synthetic launch trees are generated on the fly (see generator.py), so no ROS installation is needed
+other than the dependencies of the visualizer.
+"""
@@ -0,0 +1,140 @@
+""" Generator of synthetic launch file hierarchies.
+
+Launch files are spread over a number of fake catkin packages (directories with a package.xml) and
+include each other through $(find PACKAGE), so the generated workspace doubles as a local stand-in for
+the ROS package path: its PackageIndex is returned alongside the root launch file.
+"""
+
+import os
+import random
+import logging
+
+from utils.package_index import PackageIndex
+
+logger = logging.getLogger(__name__)
+
+PACKAGE_XML = """<?xml version="1.0"?>
+<package format="2">
+  <name>{name}</name>
+  <version>0.0.0</version>
+  <description>Synthetic benchmark package</description>
+  <maintainer email="bench@example.com">bench</maintainer>
+  <license>BSD</license>
+</package>
+"""
+
+""" Parameters of a generated launch tree.
+
+Args:
+    depth:          Number of include levels below the root file.
+    fan_out:        Number of includes in every non-leaf launch file.
+    nodes:          Number of nodes in every launch file.
+    args:           Number of (string) arguments declared by, and passed to, every launch file.
+    group_density:  Fraction of nodes placed inside a namespaced <group>.
+    if_density:     Fraction of nodes and includes with an if / unless condition.
+    eval_density:   Fraction of conditions and node args written as $(eval ...) rather than $(arg ...).
+    packages:       Number of packages the launch files are spread over.
+    seed:           Seed of the random choices, so the same config always generates the same tree.
+"""
+class TreeConfig:
+    def __init__(self, depth=3, fan_out=3, nodes=5, args=5, group_density=0.3, if_density=0.3, eval_density=0.3,
+                 packages=4, seed=0):
+        self.depth = depth
+        self.fan_out = fan_out
+        self.nodes = nodes
+        self.args = args
+        self.group_density = group_density
+        self.if_density = if_density
+        self.eval_density = eval_density
+        self.packages = packages
+        self.seed = seed
+
+    def to_dict(self):
+        return dict(self.__dict__)
+
+    def file_count(self):
+        return sum(self.fan_out ** level for level in range(self.depth + 1))
+
+""" Write a launch tree described by the given TreeConfig to directory.
+
+Returns:
+    A (root launch file, PackageIndex) tuple, where the index covers the generated packages only.
+"""
+def generate_tree(directory, config):
+    rng = random.Random(config.seed)
+    packages = ["bench_pkg_{}".format(idx) for idx in range(config.packages)]
+    for package in packages:
+        launch_dir = os.path.join(directory, package, "launch")
+        if not os.path.isdir(launch_dir):
+            os.makedirs(launch_dir)
+        with open(os.path.join(directory, package, "package.xml"), "w") as file_:
+            file_.write(PACKAGE_XML.format(name=package))
+
+    # files are named after their position in the tree, e.g. f_0_2_1, and spread round-robin over packages
+    count = [0]
+    def write_file(name, level):
+        package = packages[count[0] % len(packages)]
+        count[0] += 1
+        children = []
+        if level < config.depth:
+            for idx in range(config.fan_out):
+                children.append(write_file("{}_{}".format(name, idx), level + 1))
+
+        filename = os.path.join(directory, package, "launch", name + ".launch")
+        with open(filename, "w") as file_:
+            file_.write(_launch_file(rng, config, name, children))
+        return package, name
+
+    write_file("f", 0)
+    logger.info("Generated {} launch files in {}".format(count[0], directory))
+
+    index = PackageIndex([directory])
+    index.crawl()
+    return os.path.join(directory, packages[0], "launch", "f.launch"), index
+
+#------------------------------------- INTERNAL FUNCTIONS ------------------------------------#
+
+def _condition(rng, config):
+    # an if / unless attribute (with leading space), or nothing
+    if rng.random() >= config.if_density:
+        return ""
+    if rng.random() < config.eval_density:
+        return ' if="$(eval enabled and int(count) > 1)"'
+    if rng.random() < 0.5:
+        return ' if="$(arg enabled)"'
+    return ' unless="$(arg disabled)"'
+
+def _launch_file(rng, config, name, children):
+    lines = ['<launch>']
+    lines.append('  <arg name="enabled" default="true"/>')
+    lines.append('  <arg name="disabled" default="false"/>')
+    lines.append('  <arg name="count" default="3"/>')
+    for idx in range(config.args):
+        lines.append('  <arg name="a{}" default="{}_{}"/>'.format(idx, name, idx))
+    lines.append('  <arg name="prefix" value="$(arg a0)_$(arg count)"/>' if config.args else
+                 '  <arg name="prefix" value="$(arg count)"/>')
+
+    for idx in range(config.nodes):
+        if rng.random() < config.eval_density:
+            node_args = "--rate $(eval int(count) * {})".format(idx + 1)
+        else:
+            node_args = "--prefix $(arg prefix) --id {}".format(idx)
+        node = '<node name="{}_n{}" pkg="bench_pkg_0" type="node" args="{}"{}/>'.format(
+            name, idx, node_args, _condition(rng, config))
+        if rng.random() < config.group_density:
+            lines.append('  <group ns="g{}">'.format(idx))
+            lines.append('    ' + node)
+            lines.append('  </group>')
+        else:
+            lines.append('  ' + node)
+
+    for package, child in children:
+        lines.append('  <include file="$(find {})/launch/{}.launch" ns="{}"{}>'.format(
+            package, child, child, _condition(rng, config)))
+        for idx in range(config.args):
+            lines.append('    <arg name="a{}" value="$(arg a{})"/>'.format(idx, idx))
+        lines.append('    <arg name="count" value="$(arg count)"/>')
+        lines.append('  </include>')
+
+    lines.append('</launch>')
+    return "\n".join(lines) + "\n"
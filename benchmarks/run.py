@@ -0,0 +1,172 @@
+""" Time each stage of the analysis on a synthetic launch tree and record the results as JSON.
+
+Stages are timed separately: substitution arg evaluation, evaluation of individual launch files, building
+the whole graph and generating the visualizer's plot config. Results can be compared against a previous
+run to catch regressions, e.g.:
+
+    python2 -m benchmarks.run -o baseline.json
+    python2 -m benchmarks.run -o current.json --compare baseline.json
+"""
+
+import os
+import sys
+import json
+import shutil
+import logging
+import argparse
+import tempfile
+import platform
+import timeit
+
+from utils import parser
+from utils.parser import LaunchFile, XmlCache
+from utils.visualizer import Visualizer
+from benchmarks.generator import TreeConfig, generate_tree
+
+logger = logging.getLogger(__name__)
+
+# bump whenever the layout of the results changes
+VERSION = 1
+
+# substitution args evaluated by the substitution benchmark, covering each kind we evaluate
+SUBSTITUTIONS = (
+    "plain text without substitutions",
+    "$(arg a0)",
+    "--prefix $(arg prefix) --id $(arg count)",
+    "$(find bench_pkg_0)/launch/f.launch",
+    "$(optenv BENCHMARK_UNSET default)",
+    "$(eval int(count) * 2)",
+    "$(eval enabled and int(count) > 1)")
+
+""" Run function repeat times, returning statistics of its wall clock time in seconds.
+"""
+def measure(function, repeat):
+    times = []
+    for _ in range(repeat):
+        start = timeit.default_timer()
+        function()
+        times.append(timeit.default_timer() - start)
+    times.sort()
+    return {"repeat": repeat, "min": times[0], "median": times[len(times) // 2], "mean": sum(times) / len(times)}
+
+""" Run all benchmarks on the tree described by config.
+
+Returns:
+    A JSON serializable dictionary of the config, environment and the timings of each benchmark.
+"""
+def run_benchmarks(config, repeat=5, directory=None):
+    cleanup = directory is None
+    directory = tempfile.mkdtemp(prefix="launchalyzer-bench-") if cleanup else directory
+    try:
+        root, index = generate_tree(directory, config)
+        launch_files = sorted(os.path.join(path, name) for path, _, names in os.walk(directory)
+                              for name in names if name.endswith(".launch"))
+
+        # evaluate everything in memory; only the generated packages can be found
+        LaunchFile.initialize(None)
+        LaunchFile.substituter.package_index = index
+        substituter = LaunchFile.substituter
+        context = dict(("a{}".format(idx), "value_{}".format(idx)) for idx in range(max(config.args, 1)))
+        context.update({"prefix": "p", "count": "3", "enabled": "true"})
+
+        def substitute():
+            for _ in range(100):
+                for string in SUBSTITUTIONS:
+                    substituter.evaluate(string, context, {})
+
+        def evaluate_files():
+            # a fresh XML cache each run, so every file is read and parsed
+            LaunchFile.xml_cache = XmlCache()
+            for filename in launch_files:
+                launch_file = LaunchFile(filename)
+                launch_file.get_nodes()
+                launch_file.get_children()
+
+        graphs = []
+        def build():
+            LaunchFile.xml_cache = XmlCache()
+            graphs[:] = [parser.build_graph(root)]
+
+        results = {}
+        results["substitution"] = measure(substitute, repeat)
+        results["substitution"]["calls"] = 100 * len(SUBSTITUTIONS)
+        results["launch_file"] = measure(evaluate_files, repeat)
+        results["launch_file"]["files"] = len(launch_files)
+        results["build_graph"] = measure(build, repeat)
+
+        graph = graphs[0]
+        results["build_graph"]["files"] = len(graph)
+        results["build_graph"]["nodes"] = sum(len(entry["nodes"]) for entry in graph.values())
+        results["visualizer"] = measure(lambda: Visualizer(root, graph).get_config(), repeat)
+
+        return {
+            "version": VERSION,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "config": config.to_dict(),
+            "results": results}
+    finally:
+        if cleanup:
+            shutil.rmtree(directory, ignore_errors=True)
+
+""" Compare the minimum times of two sets of results.
+
+Returns:
+    A list of (benchmark, baseline time, current time) tuples of the benchmarks that got slower by more
+    than the given fraction.
+"""
+def compare(baseline, current, tolerance=0.2):
+    if baseline.get("config") != current.get("config"):
+        logger.warning("Comparing results of different benchmark configurations.")
+
+    regressions = []
+    for name, result in sorted(current["results"].items()):
+        previous = baseline["results"].get(name)
+        if previous is None:
+            continue
+        if result["min"] > previous["min"] * (1.0 + tolerance):
+            regressions.append((name, previous["min"], result["min"]))
+    return regressions
+
+def parse_args():
+    defaults = TreeConfig()
+    argparser = argparse.ArgumentParser(description="Benchmark launchalyzer on a synthetic launch tree.")
+    argparser.add_argument("-o", "--output", help="file to write the JSON results to (default: stdout)", default=None)
+    argparser.add_argument("-r", "--repeat", help="number of times each benchmark is run", type=int, default=5)
+    argparser.add_argument("--compare", help="results of a previous run to check for regressions against", default=None)
+    argparser.add_argument("--tolerance", help="fraction a benchmark may slow down by before it's a regression", type=float, default=0.2)
+    argparser.add_argument("--keep", help="generate the tree in this directory and keep it", default=None)
+    argparser.add_argument("--depth", type=int, default=defaults.depth)
+    argparser.add_argument("--fan-out", type=int, default=defaults.fan_out)
+    argparser.add_argument("--nodes", type=int, default=defaults.nodes)
+    argparser.add_argument("--args", type=int, default=defaults.args)
+    argparser.add_argument("--group-density", type=float, default=defaults.group_density)
+    argparser.add_argument("--if-density", type=float, default=defaults.if_density)
+    argparser.add_argument("--eval-density", type=float, default=defaults.eval_density)
+    argparser.add_argument("--packages", type=int, default=defaults.packages)
+    argparser.add_argument("--seed", type=int, default=defaults.seed)
+    return argparser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    config = TreeConfig(args.depth, args.fan_out, args.nodes, args.args, args.group_density, args.if_density,
+                        args.eval_density, args.packages, args.seed)
+    results = run_benchmarks(config, args.repeat, args.keep)
+
+    if args.output:
+        with open(args.output, "w") as file_:
+            json.dump(results, file_, indent=2, sort_keys=True)
+    else:
+        print(json.dumps(results, indent=2, sort_keys=True))
+
+    for name, result in sorted(results["results"].items()):
+        sys.stderr.write("{:<15} min {:.6f}s  median {:.6f}s\n".format(name, result["min"], result["median"]))
+
+    if args.compare:
+        with open(args.compare) as file_:
+            regressions = compare(json.load(file_), results, args.tolerance)
+        for name, previous, current in regressions:
+            sys.stderr.write("REGRESSION {}: {:.6f}s -> {:.6f}s\n".format(name, previous, current))
+        sys.exit(1 if regressions else 0)
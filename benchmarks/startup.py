@@ -0,0 +1,91 @@
+""" Time launchalyze.py's startup on the non-plotting path, and check it stays within a budget.
+
+This is the path pre-commit hooks run (e.g. launchalyze.py FILE --noplot), so it shouldn't pay for
+importing plotly, numpy or roslaunch. Each run is a fresh interpreter; the time of starting a bare
+interpreter is measured too and subtracted, so the budget only covers launchalyze itself.
+
+    python2 -m benchmarks.startup --budget 0.25
+"""
+
+import os
+import sys
+import json
+import shutil
+import logging
+import argparse
+import tempfile
+import subprocess
+import timeit
+
+from benchmarks.generator import TreeConfig, generate_tree
+
+logger = logging.getLogger(__name__)
+
+LAUNCHALYZE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "launchalyze.py")
+
+# modules which must not be imported on the non-plotting path
+HEAVY_MODULES = ("plotly", "chart_studio", "numpy", "roslaunch", "rospkg", "multiprocessing")
+
+# runs launchalyze.py in-process, then reports which heavy modules it imported
+IMPORT_CHECK = """
+import sys, json, runpy
+sys.argv = {argv!r}
+runpy.run_path({script!r}, run_name="__main__")
+print(json.dumps(sorted(name for name in {modules!r} if name in sys.modules)))
+"""
+
+""" Run the given command repeat times, returning the median wall clock time in seconds.
+"""
+def time_command(command, repeat, env=None):
+    times = []
+    with open(os.devnull, "w") as devnull:
+        for _ in range(repeat):
+            start = timeit.default_timer()
+            subprocess.check_call(command, stdout=devnull, stderr=devnull, env=env)
+            times.append(timeit.default_timer() - start)
+    times.sort()
+    return times[len(times) // 2]
+
+""" Measure the startup overhead of analyzing a small launch tree without plotting.
+
+Returns:
+    A JSON serializable dictionary of the interpreter / launchalyze times, the overhead of the latter and
+    the heavy modules imported along the way.
+"""
+def measure_startup(repeat=10, python=sys.executable):
+    directory = tempfile.mkdtemp(prefix="launchalyzer-startup-")
+    try:
+        root, _ = generate_tree(directory, TreeConfig(depth=1, fan_out=2, nodes=2, args=2))
+        env = dict(os.environ)
+        env["ROS_PACKAGE_PATH"] = directory
+        argv = [LAUNCHALYZE, root, "--noplot", "--quiet"]
+
+        interpreter = time_command([python, "-c", "pass"], repeat, env)
+        launchalyze = time_command([python] + argv, repeat, env)
+        check = IMPORT_CHECK.format(argv=argv, script=LAUNCHALYZE, modules=HEAVY_MODULES)
+        imported = json.loads(subprocess.check_output([python, "-c", check], env=env).decode("utf-8").strip().splitlines()[-1])
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    return {"interpreter": interpreter, "launchalyze": launchalyze, "overhead": launchalyze - interpreter, "heavy_imports": imported}
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(description="Check launchalyze.py's startup time on the non-plotting path.")
+    argparser.add_argument("-r", "--repeat", help="number of runs to take the median of", type=int, default=10)
+    argparser.add_argument("-b", "--budget", help="maximum startup overhead in seconds", type=float, default=0.25)
+    argparser.add_argument("-o", "--output", help="file to write the JSON results to", default=None)
+    args = argparser.parse_args()
+
+    result = measure_startup(args.repeat)
+    result["budget"] = args.budget
+    if args.output:
+        with open(args.output, "w") as file_:
+            json.dump(result, file_, indent=2, sort_keys=True)
+
+    sys.stderr.write("startup overhead {:.3f}s (budget {:.3f}s), interpreter {:.3f}s\n".format(
+        result["overhead"], args.budget, result["interpreter"]))
+    if result["heavy_imports"]:
+        sys.stderr.write("FAIL: imported {}\n".format(", ".join(result["heavy_imports"])))
+    if result["overhead"] > args.budget:
+        sys.stderr.write("FAIL: over budget\n")
+    sys.exit(1 if result["heavy_imports"] or result["overhead"] > args.budget else 0)
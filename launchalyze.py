@@ -3,28 +3,187 @@
 # make sure this is run with python 2 (blah)
 import sys
 import os
+import json
+import errno
 import argparse
 import logging
 if sys.version_info[0] != 2:
     raise RuntimeError("This script must be run with python2.")
 
+# only what every analysis needs is imported up front; everything else (plotly in particular) is imported on
+# the code paths that use it, so e.g. --noplot runs and pre-commit checks start quickly
 import utils.parser
-from utils.visualizer import Visualizer
+import utils.profiler
 
 def parse_args():
     parser = argparse.ArgumentParser()
-    parser.add_argument("launch_info", help="Path to the launch file to analyze and optional arguments", nargs="+")
+    parser.add_argument("launch_info", help="Path to the launch file to analyze and optional arguments", nargs="*")
     parser.add_argument("-v", "--verbose", help="increase output verbosity", action="store_true")
     parser.add_argument("-q", "--quiet", help="decrease output verbosity", action="store_true")
     parser.add_argument("-np", "--noplot", help="don't plot the generated html", action="store_true")
+    parser.add_argument("-c", "--cache-dir", help="directory of a persistent cache of evaluated launch files", default=None)
+    parser.add_argument("-p", "--params", help="load the full launch tree (including all params) through roslaunch", action="store_true")
+    parser.add_argument("-j", "--jobs", help="number of processes used to expand sibling launch files in parallel", type=int, default=1)
+    parser.add_argument("-d", "--depth", help="only show launch files up to this include depth, summarizing the rest", type=int, default=None)
+    parser.add_argument("-m", "--min-size", help="summarize launch files whose subtree spawns fewer nodes than this", type=int, default=0)
+    parser.add_argument("-r", "--renderer", help="how to render the graph: plotly (interactive Sankey), or without plotly as dot, svg or html", choices=("plotly", "dot", "svg", "html"), default="plotly")
+    parser.add_argument("-o", "--output", help="file to render the graph to (default depends on the renderer)", default=None)
+    parser.add_argument("--hover-length", help="truncate hover text to this many characters (full text is loaded on click)", type=int, default=None)
+    parser.add_argument("-s", "--sweep", help="analyze every combination of the given argument values, e.g. 'sim:=true,false'; may be repeated", action="append", default=[])
+    parser.add_argument("-b", "--batch", help="analyze every job in the given JSON lines manifest, printing one JSON line of results per job", default=None)
+    parser.add_argument("-w", "--watch", help="stay running, re-analyzing and re-plotting whenever a launch file in the tree changes", action="store_true")
+    parser.add_argument("--interval", help="seconds between checks for changed files in watch mode", type=float, default=1.0)
+    parser.add_argument("--stream", help="print a JSON line per launch file and node as they're evaluated, without building the whole graph (implies --noplot)", choices=("jsonl",), default=None)
+    parser.add_argument("-e", "--export", help="save the analysis to this file (JSON if it ends in .json, otherwise binary)", default=None)
+    parser.add_argument("-l", "--load", help="visualize an analysis saved with --export instead of parsing a launch file", default=None)
+    parser.add_argument("--profile", help="write a Chrome trace of the analysis to this file and print a summary of where the time went", default=None)
 
     args = parser.parse_args()
+    if not args.launch_info and not args.batch and not args.load:
+        parser.error("a launch file (or --batch manifest, or --load analysis) is required")
     return args
 
+def diff(argv):
+    # launchalyze.py diff OLD NEW: compare two analyses saved with --export
+    parser = argparse.ArgumentParser(prog="launchalyze.py diff", description="Compare two analyses saved with --export.")
+    parser.add_argument("old", help="analysis to compare against")
+    parser.add_argument("new", help="analysis to compare")
+    parser.add_argument("--json", help="print one JSON line per change", action="store_true")
+    args = parser.parse_args(argv)
+
+    import utils.export
+    import utils.graph_diff
+    logging.basicConfig(level=logging.WARNING)
+    _, old = utils.export.load_graph(args.old)
+    _, new = utils.export.load_graph(args.new)
+    changes = utils.graph_diff.diff_graphs(old, new)
+    if args.json:
+        for change in changes:
+            print(json.dumps(change, sort_keys=True, default=str))
+    else:
+        for line in utils.graph_diff.format_changes(changes):
+            print(line)
+    return 1 if changes else 0
+
+def query(argv):
+    # launchalyze.py query ANALYSIS --node/--arg/--package NAME: look things up in an analysis saved with --export
+    parser = argparse.ArgumentParser(prog="launchalyze.py query", description="Query an analysis saved with --export.")
+    parser.add_argument("analysis", help="analysis to query")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("-n", "--node", help="which launch files launch this node, and which args control it", default=None)
+    group.add_argument("-a", "--arg", help="which includes and nodes depend on this argument", default=None)
+    group.add_argument("-k", "--package", help="which nodes run executables of this package", default=None)
+    parser.add_argument("--json", help="print the result as JSON", action="store_true")
+    args = parser.parse_args(argv)
+
+    import utils.export
+    import utils.query
+    logging.basicConfig(level=logging.WARNING)
+    _, graph = utils.export.load_graph(args.analysis)
+    index = utils.query.QueryIndex(graph)
+    describe = lambda key: "{} (ns {})".format(graph[key]["object"].fullpath, graph[key]["object"].namespace)
+
+    if args.node:
+        result = {
+            "launched_by": [[describe(key) for key in chain] for chain in index.launched_by(args.node)],
+            "controlled_by": [{"file": describe(key), "args": names} for key, names in index.controlled_by(args.node)]}
+        lines = []
+        for chain in result["launched_by"]:
+            lines.append("launched by:")
+            lines.extend("  " * depth + "  " + name for depth, name in enumerate(chain))
+        for control in result["controlled_by"]:
+            lines.append("controlled by args {} of {}".format(", ".join(control["args"]), control["file"]))
+    elif args.arg:
+        dependents = index.dependents(args.arg)
+        result = {
+            "includes": [{"file": describe(key), "include": describe(child)} for key, child in dependents["includes"]],
+            "nodes": [{"file": describe(key), "node": name} for key, name in dependents["nodes"]]}
+        lines = ["include {include} from {file}".format(**include) for include in result["includes"]]
+        lines.extend("node {node} from {file}".format(**node) for node in result["nodes"])
+    else:
+        result = [{"file": describe(key), "node": name} for key, name in index.package_nodes(args.package)]
+        lines = ["node {node} from {file}".format(**node) for node in result]
+
+    if args.json:
+        print(json.dumps(result, sort_keys=True))
+    else:
+        for line in lines:
+            print(line)
+    return 0 if lines else 1
+
+def serve(argv):
+    # launchalyze.py serve [--port PORT]: answer JSON-RPC analysis requests, keeping caches warm between them
+    parser = argparse.ArgumentParser(prog="launchalyze.py serve", description="Serve analyses over JSON-RPC on localhost HTTP.")
+    parser.add_argument("--host", help="address to listen on", default="127.0.0.1")
+    parser.add_argument("--port", help="port to listen on", type=int, default=8765)
+    parser.add_argument("-w", "--workers", help="number of threads answering requests", type=int, default=4)
+    parser.add_argument("-c", "--cache-dir", help="directory of a persistent cache of evaluated launch files", default=None)
+    parser.add_argument("-v", "--verbose", help="increase output verbosity", action="store_true")
+    args = parser.parse_args(argv)
+
+    import utils.server
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO)
+    utils.server.serve(args.host, args.port, args.workers, args.cache_dir)
+    return 0
+
+def plot(launch_file, graph, args, auto_open=True):
+    from utils.visualizer import Visualizer
+    from utils.renderers import get_renderer
+    renderer = get_renderer(args.renderer, auto_open)
+    with utils.profiler.span("visualizer"):
+        visualizer = Visualizer(launch_file, graph, args.depth, args.min_size, args.hover_length)
+    with utils.profiler.span("plot"):
+        visualizer.render(renderer, args.output)
+
+def write_profile(filename):
+    # record the final cache statistics alongside the timings
+    profile = utils.profiler.active
+    for name, value in utils.parser.LaunchFile.cache_info().items():
+        profile.counters["cache." + name] = value
+    profile.write(filename)
+    sys.stderr.write(profile.summary() + "\n")
+
 if __name__ == "__main__":
+    # subcommands
+    if sys.argv[1:2] == ["diff"]:
+        sys.exit(diff(sys.argv[2:]))
+    if sys.argv[1:2] == ["query"]:
+        sys.exit(query(sys.argv[2:]))
+    if sys.argv[1:2] == ["serve"]:
+        sys.exit(serve(sys.argv[2:]))
+
     # parse arguments
     args = parse_args()
 
+    if args.verbose:
+        level = logging.DEBUG
+    elif args.quiet:
+        level = logging.WARNING
+    else:
+        level = logging.INFO
+    logging.basicConfig(level=level)
+    logger = logging.getLogger(__name__)
+
+    if args.profile:
+        utils.profiler.enable()
+
+    # analyze a whole manifest of launch files in this process
+    if args.batch:
+        import utils.batch
+        with utils.profiler.span("batch"):
+            failures = utils.batch.run_batch(args.batch, sys.stdout, args.verbose, args.cache_dir, args.jobs, args.params)
+        if args.profile:
+            write_profile(args.profile)
+        sys.exit(1 if failures else 0)
+
+    # visualize a previously exported analysis; this doesn't need ROS
+    if args.load:
+        import utils.export
+        metadata, graph = utils.export.load_graph(args.load)
+        if not args.noplot:
+            plot(metadata.get("launch_file", args.load), graph, args)
+        sys.exit(0)
+
     # sanity check arguments
     launch_file = args.launch_info[0]
     if not os.path.isfile(os.path.expanduser(launch_file)):
@@ -37,20 +196,62 @@ if __name__ == "__main__":
         arg, value = argument.split(":=")
         input_arguments[arg] = value
 
-    if args.verbose:
-        level = logging.DEBUG
-    elif args.quiet:
-        level = logging.WARNING
-    else:
-        level = logging.INFO
-    logging.basicConfig(level=level)
-    logger = logging.getLogger(__name__)
+    # analyze every combination of the sweep arguments, printing one JSON line per distinct set of nodes
+    if args.sweep:
+        import utils.sweep
+        sweep_arguments = utils.sweep.parse_sweep_arguments(args.sweep)
+        with utils.profiler.span("sweep"):
+            results = utils.sweep.sweep(launch_file, input_arguments, sweep_arguments, args.verbose, args.cache_dir)
+        for nodes, combinations in results:
+            print(json.dumps({"combinations": combinations, "nodes": nodes}, sort_keys=True))
+        if args.profile:
+            write_profile(args.profile)
+        sys.exit(0)
+
+    # re-analyze on every change, overwriting the same plot (only opened in a browser the first time)
+    if args.watch:
+        import utils.watch
+        plots = []
+        def update(graph):
+            if not args.noplot:
+                plot(launch_file, graph, args, auto_open=not plots)
+                plots.append(True)
+            logger.info("Updated analysis of {}: {} launch files, {} nodes.".format(
+                launch_file, len(graph), sum(len(entry["nodes"]) for entry in graph.values())))
+        try:
+            utils.watch.watch(launch_file, input_arguments, update, args.interval, args.verbose, args.cache_dir, args.params)
+        except KeyboardInterrupt:
+            pass
+        sys.exit(0)
+
+    # print the launch files and nodes as the tree is walked, never holding all of it in memory
+    if args.stream:
+        with utils.profiler.span("stream"):
+            try:
+                for record in utils.parser.iter_graph(launch_file, input_arguments, args.verbose, args.cache_dir, args.params):
+                    sys.stdout.write(json.dumps(record, sort_keys=True) + "\n")
+                    sys.stdout.flush()
+            except IOError as error:
+                # the reader has gone away (e.g. piped into head), so there's no point carrying on
+                if error.errno != errno.EPIPE:
+                    raise
+        if args.profile:
+            write_profile(args.profile)
+        sys.exit(0)
 
     # parse launch file
     logger.info("Analyzing {} with arguments {}".format(launch_file, input_arguments))
-    graph = utils.parser.build_graph(launch_file, input_arguments, args.verbose)
+    with utils.profiler.span("build_graph"):
+        graph = utils.parser.build_graph(launch_file, input_arguments, args.verbose, args.cache_dir, args.jobs, args.params)
+
+    if args.export:
+        import utils.export
+        with utils.profiler.span("export"):
+            utils.export.export_graph(graph, args.export, {"launch_file": launch_file, "args": input_arguments})
 
     # construct visualizer and plot
-    visualizer = Visualizer(launch_file, graph)
     if not args.noplot:
-        visualizer.plot()
+        plot(launch_file, graph, args)
+
+    if args.profile:
+        write_profile(args.profile)
@@ -0,0 +1,86 @@
+""" Analyze many (launch file, arguments) configurations in a single process.
+
+Jobs are read from a manifest of JSON lines, e.g.:
+
+    {"launch_file": "~/ws/src/robot/launch/bringup.launch", "args": {"sim": "true"}}
+
+All jobs share the same substituter (and package index), parsed XML and analysis caches. One JSON line of
+results is written per job, in manifest order, as soon as that job is finished.
+"""
+
+import os
+import json
+import logging
+
+import parser
+
+logger = logging.getLogger(__name__)
+
+""" Read the jobs in the given manifest file.
+
+Returns:
+    A list of (launch_file, input_arguments) tuples; blank lines and lines starting with '#' are skipped.
+"""
+def read_manifest(filename):
+    jobs = []
+    with open(os.path.expanduser(filename)) as file_:
+        for number, line in enumerate(file_, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                job = json.loads(line)
+                jobs.append((os.path.expanduser(job["launch_file"]), dict(job.get("args", {}))))
+            except (ValueError, KeyError, TypeError):
+                raise RuntimeError("Malformed job on line {} of manifest {}.".format(number, filename))
+    return jobs
+
+""" Summarize a graph built by build_graph as a JSON serializable dictionary.
+"""
+def summarize(graph):
+    files = []
+    nodes = []
+    for key, entry in graph.items():
+        files.append(parser.file_record(entry["object"]))
+        nodes.extend(parser.node_record(node, key) for node in entry["nodes"])
+    return {"files": files, "nodes": nodes}
+
+""" Analyze every job in the given manifest, writing one JSON line per job to output.
+
+A job that fails is reported with an 'error' entry rather than aborting the whole batch.
+
+Returns:
+    The number of failed jobs.
+"""
+def run_batch(manifest, output, verbose=False, cache_dir=None, jobs=1, full_params=False):
+    failures = 0
+    for launch_file, input_arguments in read_manifest(manifest):
+        logger.info("Analyzing {} with arguments {}".format(launch_file, input_arguments))
+        result = {"launch_file": launch_file, "args": input_arguments}
+        try:
+            input_arguments = dict((name, _argument_value(name, value)) for name, value in input_arguments.items())
+            graph = parser.build_graph(launch_file, input_arguments, verbose, cache_dir, jobs, full_params)
+            result.update(summarize(graph))
+        except parser.BUILD_ERRORS as error:
+            logger.error("Failed to analyze {}: {}".format(launch_file, error))
+            result["error"] = str(error)
+            failures += 1
+
+        output.write(json.dumps(result, sort_keys=True, default=str) + "\n")
+        output.flush()
+
+    if parser.LaunchFile.xml_cache is not None:
+        logger.info("Parsed XML cache: {} hits, {} misses.".format(parser.LaunchFile.xml_cache.hits, parser.LaunchFile.xml_cache.misses))
+    return failures
+
+#------------------------------------- INTERNAL FUNCTIONS ------------------------------------#
+
+def _argument_value(name, value):
+    # argument values are strings, as on the command line; JSON booleans are spelled the roslaunch way
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (int, float)):
+        return str(value)
+    if value is None or isinstance(value, (list, dict)):
+        raise RuntimeError("Unsupported value {} of argument '{}'; expected a string, number or boolean.".format(json.dumps(value), name))
+    return value
@@ -0,0 +1,100 @@
+""" Persistent on-disk cache of evaluated launch files.
+
+Each entry holds the results of evaluating a single launch file (its arguments, nodes and includes) and is
+keyed by a hash of the file's contents, the arguments passed into it and the namespace it's launched in.
+Unchanged files launched with unchanged inputs can then be reloaded instead of re-evaluated.
+"""
+
+import os
+import json
+import hashlib
+import logging
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+class AnalysisCache:
+    # bump whenever the layout of cached records changes
+    VERSION = 8
+
+    # environment variables that affect evaluation results beyond what's recorded per file ($(find) lookups)
+    ENVIRONMENT = ("ROS_ROOT", "ROS_PACKAGE_PATH")
+
+    def __init__(self, directory):
+        self.directory = os.path.expanduser(directory)
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def key(cls, contents, input_arguments, namespace):
+        """ Compute the cache key for a launch file's contents evaluated with the given inputs.
+        """
+        digest = hashlib.sha1()
+        digest.update(contents)
+        context = {
+            "version": cls.VERSION,
+            "args": input_arguments,
+            "namespace": namespace,
+            "environment": dict((var, os.environ.get(var)) for var in cls.ENVIRONMENT)}
+        digest.update(json.dumps(context, sort_keys=True).encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, key, find_package=None):
+        """ Return the cached record for the given key, or None if there isn't a (still valid) one.
+
+        find_package should return the current directory of a package (or None), and is used to check the
+        $(find) results the record was evaluated with; packages can move without the search paths changing.
+        """
+        filename = self._filename(key)
+        try:
+            with open(filename) as file_:
+                record = json.load(file_)
+        except (IOError, OSError, ValueError):
+            self.misses += 1
+            return None
+
+        # records also depend on any environment variables read during evaluation
+        for var, value in record["environment"].items():
+            if os.environ.get(var) != value:
+                logger.debug("Cache entry {} invalidated by environment variable '{}'.".format(key, var))
+                self.misses += 1
+                return None
+        if find_package is not None:
+            for package, path in record["packages"].items():
+                if find_package(package) != path:
+                    logger.debug("Cache entry {} invalidated by package '{}'.".format(key, package))
+                    self.misses += 1
+                    return None
+
+        self.hits += 1
+        return record
+
+    def put(self, key, record):
+        """ Store a record; writes are atomic so the cache can be shared between concurrent runs.
+        """
+        if not write_json(self._filename(key), record):
+            logger.warning("Failed to write cache entry {}.".format(key))
+
+    def _filename(self, key):
+        return os.path.join(self.directory, key + ".json")
+
+def write_json(filename, data):
+    """ Atomically write data as JSON to the given file; returns whether the write succeeded.
+
+    Data is written to a temporary file in the same directory and renamed into place, so concurrent
+    readers never see a partially written file.
+    """
+    temporary = None
+    try:
+        handle, temporary = tempfile.mkstemp(dir=os.path.dirname(filename), suffix=".tmp")
+        with os.fdopen(handle, "w") as file_:
+            json.dump(data, file_)
+        os.rename(temporary, filename)
+    except (IOError, OSError):
+        if temporary and os.path.exists(temporary):
+            os.remove(temporary)
+        return False
+    return True
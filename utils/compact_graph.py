@@ -0,0 +1,259 @@
+""" Compact, immutable representation of a launch file graph built by build_graph.
+
+Launch files and nodes are identified by integer ids, all strings are interned in a single table and
+include / node edges are stored as adjacency arrays (offsets into flat arrays of ids), so a graph can be
+held in memory without any of the XML trees or parser objects it was built from.
+"""
+
+import os
+import json
+from array import array
+from collections import defaultdict
+
+""" Read-only view of a node stored in a CompactGraph, with the same interface as LaunchNode.
+"""
+class CompactNode(object):
+    __slots__ = ("name", "namespace", "attributes", "dependencies")
+
+    def __init__(self, name, namespace, attributes, dependencies):
+        self.name = name
+        self.namespace = namespace
+        self.attributes = attributes
+        self.dependencies = dependencies
+
+    def get(self, attribute, default=None):
+        for name, value in self.attributes:
+            if name == attribute:
+                return value
+        return default
+
+    @property
+    def package(self):
+        return self.get("pkg")
+
+    @property
+    def type(self):
+        return self.get("type")
+
+    def xmlattrs(self):
+        return list(self.attributes)
+
+""" Read-only view of a launch file stored in a CompactGraph, with the attributes of LaunchFile used by
+consumers of build_graph's output (e.g. the Visualizer).
+"""
+class CompactFile(object):
+    __slots__ = ("key", "fullpath", "name", "path", "namespace", "parent", "children", "input_arguments", "args", "nodes")
+
+    def __init__(self, key, fullpath, namespace, parent, children, input_arguments, args, nodes):
+        self.key = key
+        self.fullpath = fullpath
+        self.name = os.path.basename(fullpath)
+        self.path = os.path.dirname(fullpath)
+        self.namespace = namespace
+        self.parent = parent
+        self.children = children
+        self.input_arguments = input_arguments
+        self.args = args
+        self.nodes = nodes
+
+class CompactGraph(object):
+    __slots__ = (
+        "strings",
+        # per launch file: graph key, path, namespace and parent file id (-1 for the root)
+        "file_keys", "file_paths", "file_namespaces", "file_parents",
+        # per launch file argument (name, value) string ids, indexed through *_offsets
+        "input_offsets", "input_names", "input_values", "arg_offsets", "arg_names", "arg_values",
+        # include edges (child file ids) and their dependencies, indexed through child_offsets
+        "child_offsets", "child_targets", "child_dependencies",
+        # node ids of each file, indexed through node_offsets; nodes are numbered consecutively per file
+        "node_offsets", "node_names", "node_namespaces", "node_attributes", "node_dependencies",
+        # per launch file: Merkle hash of its subtree (see graph_diff), if known (e.g. loaded from an export)
+        "file_hashes",
+        "_ids")
+
+    def __init__(self):
+        self.strings = []
+        self._ids = {}
+
+        self.file_keys = array("i")
+        self.file_paths = array("i")
+        self.file_namespaces = array("i")
+        self.file_parents = array("i")
+
+        self.input_offsets = array("i")
+        self.input_names = array("i")
+        self.input_values = array("i")
+        self.arg_offsets = array("i")
+        self.arg_names = array("i")
+        self.arg_values = array("i")
+
+        self.child_offsets = array("i")
+        self.child_targets = array("i")
+        self.child_dependencies = []
+
+        self.node_offsets = array("i")
+        self.node_names = array("i")
+        self.node_namespaces = array("i")
+        self.node_attributes = []
+        self.node_dependencies = []
+
+        self.file_hashes = ()
+
+    """Build a CompactGraph from the output of build_graph.
+
+    Files are numbered in depth first order from the root(s), so a file's parent always has a lower id.
+    """
+    @classmethod
+    def from_graph(cls, graph):
+        compact = cls()
+        intern = compact._intern
+
+        # number the files
+        roots = [key for key, value in graph.items() if value["object"].parent is None]
+        order = []
+        ids = {}
+        stack = list(reversed(roots))
+        while stack:
+            key = stack.pop()
+            if key in ids:
+                continue
+            ids[key] = len(order)
+            order.append(key)
+            stack.extend(reversed(graph[key]["object"].children))
+
+        for offsets in (compact.input_offsets, compact.arg_offsets, compact.child_offsets, compact.node_offsets):
+            offsets.append(0)
+
+        for key in order:
+            entry = graph[key]
+            launch_file = entry["object"]
+            compact.file_keys.append(intern(key))
+            compact.file_paths.append(intern(launch_file.fullpath))
+            compact.file_namespaces.append(intern(launch_file.namespace))
+            compact.file_parents.append(ids.get(launch_file.parent, -1))
+
+            for name, value in sorted(launch_file.input_arguments.items()):
+                compact.input_names.append(intern(name))
+                compact.input_values.append(intern(value))
+            compact.input_offsets.append(len(compact.input_names))
+            for name, value in sorted(launch_file.args.items()):
+                compact.arg_names.append(intern(name))
+                compact.arg_values.append(intern(value))
+            compact.arg_offsets.append(len(compact.arg_names))
+
+            children = entry["children"]
+            for child in launch_file.children:
+                compact.child_targets.append(ids[child])
+                dependencies = children[child].get("dependencies") if child in children else None
+                compact.child_dependencies.append(tuple(intern(name) for name in (dependencies or ())))
+            compact.child_offsets.append(len(compact.child_targets))
+
+            node_dependencies = getattr(launch_file, "node_dependencies", {})
+            for node in entry["nodes"]:
+                compact.node_names.append(intern(node.name))
+                compact.node_namespaces.append(intern(node.namespace))
+                compact.node_attributes.append(tuple(
+                    (intern(name), intern(json.dumps(value, sort_keys=True, default=str))) for name, value in node.xmlattrs()))
+                dependencies = node_dependencies.get(node.namespace + node.name, ())
+                compact.node_dependencies.append(tuple(intern(name) for name in dependencies))
+            compact.node_offsets.append(len(compact.node_names))
+
+        compact.child_dependencies = tuple(compact.child_dependencies)
+        compact.node_attributes = tuple(compact.node_attributes)
+        compact.node_dependencies = tuple(compact.node_dependencies)
+        compact.strings = tuple(compact.strings)
+        compact._ids = None
+        return compact
+
+    def file_count(self):
+        return len(self.file_keys)
+
+    def node_count(self):
+        return len(self.node_names)
+
+    def file_id(self, key):
+        """ Return the id of the launch file with the given graph key, raising KeyError if there isn't one.
+
+        This is a linear search; build a dictionary of keys to ids for repeated lookups.
+        """
+        for file_id, string_id in enumerate(self.file_keys):
+            if self.strings[string_id] == key:
+                return file_id
+        raise KeyError(key)
+
+    def file_key(self, file_id):
+        return self.strings[self.file_keys[file_id]]
+
+    def file_path(self, file_id):
+        return self.strings[self.file_paths[file_id]]
+
+    def file_namespace(self, file_id):
+        return self.strings[self.file_namespaces[file_id]]
+
+    def parent(self, file_id):
+        return self.file_parents[file_id]
+
+    def input_arguments(self, file_id):
+        return self._arguments(self.input_offsets, self.input_names, self.input_values, file_id)
+
+    def args(self, file_id):
+        return self._arguments(self.arg_offsets, self.arg_names, self.arg_values, file_id)
+
+    def children(self, file_id):
+        return list(self.child_targets[self.child_offsets[file_id]:self.child_offsets[file_id + 1]])
+
+    def include_dependencies(self, file_id):
+        """ Return the names of the arguments each of the file's includes depends on, in include order.
+        """
+        edges = range(self.child_offsets[file_id], self.child_offsets[file_id + 1])
+        return [[self.strings[name] for name in self.child_dependencies[edge]] for edge in edges]
+
+    def nodes(self, file_id):
+        return list(range(self.node_offsets[file_id], self.node_offsets[file_id + 1]))
+
+    def node(self, node_id):
+        return CompactNode(
+            self.strings[self.node_names[node_id]],
+            self.strings[self.node_namespaces[node_id]],
+            tuple((self.strings[name], json.loads(self.strings[value])) for name, value in self.node_attributes[node_id]),
+            tuple(self.strings[name] for name in self.node_dependencies[node_id]))
+
+    def to_graph(self):
+        """ Return a view of this graph in the same layout as build_graph's output.
+        """
+        graph = defaultdict(lambda: {"object": [], "children": [], "nodes": []})
+        for file_id in range(self.file_count()):
+            key = self.file_key(file_id)
+            children = [self.file_key(child) for child in self.children(file_id)]
+            nodes = [self.node(node_id) for node_id in self.nodes(file_id)]
+            parent = self.parent(file_id)
+            graph[key]["object"] = CompactFile(
+                key,
+                self.file_path(file_id),
+                self.file_namespace(file_id),
+                self.file_key(parent) if parent >= 0 else None,
+                children,
+                self.input_arguments(file_id),
+                self.args(file_id),
+                [node.namespace + node.name for node in nodes])
+            graph[key]["children"] = dict(
+                (self.file_key(child), {"path": self.file_path(child), "namespace": self.file_namespace(child), "args": self.input_arguments(child), "dependencies": dependencies})
+                for child, dependencies in zip(self.children(file_id), self.include_dependencies(file_id)))
+            graph[key]["nodes"] = nodes
+            if self.file_hashes:
+                graph[key]["hash"] = self.file_hashes[file_id]
+        return graph
+
+    #------------------------------------- INTERNAL FUNCTIONS ------------------------------------#
+
+    def _intern(self, string):
+        string_id = self._ids.get(string)
+        if string_id is None:
+            string_id = len(self.strings)
+            self._ids[string] = string_id
+            self.strings.append(string)
+        return string_id
+
+    def _arguments(self, offsets, names, values, file_id):
+        start, end = offsets[file_id], offsets[file_id + 1]
+        return dict((self.strings[names[idx]], self.strings[values[idx]]) for idx in range(start, end))
@@ -0,0 +1,101 @@
+""" Tracking of which input arguments a launch file's evaluation actually depends on.
+
+A launch file's evaluated contents (args, nodes, includes) are a function of its contents, namespace and
+only those input arguments it read while being evaluated. Recording that set lets us reuse the results
+for any other set of inputs that agrees on it, e.g. when sweeping over argument combinations.
+"""
+
+import logging
+from collections import defaultdict, OrderedDict
+
+logger = logging.getLogger(__name__)
+
+""" Dictionary of arguments that records the names of all the keys that are looked up.
+
+Lookups of missing keys are recorded too, since supplying that argument would change the result.
+"""
+class TrackedArguments(dict):
+    def __init__(self, *args, **kwargs):
+        dict.__init__(self, *args, **kwargs)
+        self.reads = set()
+
+    def __contains__(self, key):
+        self.reads.add(key)
+        return dict.__contains__(self, key)
+
+    def __getitem__(self, key):
+        self.reads.add(key)
+        return dict.__getitem__(self, key)
+
+    def get(self, key, default=None):
+        self.reads.add(key)
+        return dict.get(self, key, default)
+
+    def keys(self):
+        # conservatively treat enumerating the arguments as reading all of them
+        self.reads.update(dict.keys(self))
+        return dict.keys(self)
+
+""" In-memory memo of evaluated launch files, keyed by the values of the input arguments they depend on.
+
+Each (file, namespace) pair may have several entries, one per distinct projection of its inputs onto the
+arguments that evaluation read, and onto whether the inputs it only passed along were supplied (see
+LaunchFile._argument_callback).
+
+Args:
+    max_entries:    Optional number of entries kept (over all files); the least recently used are dropped.
+"""
+class DependencyMemo:
+    # marker for dependencies that weren't supplied at all (as opposed to supplied as an empty string)
+    MISSING = None
+
+    def __init__(self, max_entries=None):
+        self.entries = defaultdict(list)
+        self.max_entries = max_entries
+
+        # (file, namespace) and entry of every entry, keyed by id and least recently used first; only kept if bounded
+        self.recent = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def project(cls, input_arguments, dependencies, presence=()):
+        return (tuple(input_arguments.get(name, cls.MISSING) for name in dependencies),
+                tuple(bool(input_arguments.get(name)) for name in presence))
+
+    def lookup(self, fullpath, namespace, input_arguments):
+        """ Return the record of a previous evaluation that read the same values as the given inputs, if any.
+        """
+        for entry in self.entries.get((fullpath, namespace), ()):
+            dependencies, presence, values, record = entry
+            if self.project(input_arguments, dependencies, presence) == values:
+                if self.max_entries is not None:
+                    self.recent[id(entry)] = self.recent.pop(id(entry))
+                self.hits += 1
+                return record
+        self.misses += 1
+        return None
+
+    def store(self, fullpath, namespace, input_arguments, dependencies, record, presence=()):
+        """ Store the record of an evaluation that read the given dependencies, and only depends on whether the
+        presence arguments were supplied (non-empty).
+        """
+        dependencies = tuple(sorted(dependencies))
+        presence = tuple(sorted(set(presence) - set(dependencies)))
+        entry = (dependencies, presence, self.project(input_arguments, dependencies, presence), record)
+        self.entries[(fullpath, namespace)].append(entry)
+
+        if self.max_entries is not None:
+            self.recent[id(entry)] = ((fullpath, namespace), entry)
+            while len(self.recent) > self.max_entries:
+                key, dropped = self.recent.popitem(last=False)[1]
+                self.entries[key] = [entry for entry in self.entries[key] if entry is not dropped]
+                if not self.entries[key]:
+                    del self.entries[key]
+
+    def discard(self, fullpath):
+        """ Drop every entry of the given file (in all namespaces), e.g. once its contents have changed.
+        """
+        for key in [key for key in self.entries.keys() if key[0] == fullpath]:
+            for entry in self.entries.pop(key):
+                self.recent.pop(id(entry), None)
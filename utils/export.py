@@ -0,0 +1,203 @@
+""" Export of analyzed launch trees, and loading them back without ROS.
+
+A graph built by build_graph is stored as the fields of its CompactGraph (see compact_graph.py) along with
+some metadata (e.g. the launch file and arguments analyzed), in one of two versioned formats:
+
+    JSON:   {"format": "launchalyzer", "version": VERSION, "metadata": {...}, "graph": {FIELD: [...], ...}}
+
+    binary: MAGIC, then the version, the length prefixed JSON metadata and every field in FIELDS order. All
+            integers are little endian uint32 / int32; strings are length prefixed UTF-8; arrays are
+            length prefixed; nested arrays are stored as an array of offsets and a flat array of values.
+
+Each file's subtree hash (see graph_diff) is computed on export and stored with it, so diffing two exports
+doesn't need to hash them again.
+
+Loading either only needs the standard library, so analyses can be precomputed on a machine with ROS and
+consumed (visualized, queried, diffed) anywhere.
+"""
+
+import json
+import struct
+import logging
+from array import array
+
+from compact_graph import CompactGraph
+from graph_diff import tree_hashes
+
+logger = logging.getLogger(__name__)
+
+# bump whenever the layout of exported graphs changes
+VERSION = 2
+
+MAGIC = b"LAGRAPH\x00"
+
+# CompactGraph fields by how they are stored
+INT_ARRAYS = (
+    "file_keys", "file_paths", "file_namespaces", "file_parents",
+    "input_offsets", "input_names", "input_values", "arg_offsets", "arg_names", "arg_values",
+    "child_offsets", "child_targets", "node_offsets", "node_names", "node_namespaces")
+NESTED_ARRAYS = ("child_dependencies", "node_dependencies", "node_attributes")
+STRING_ARRAYS = ("file_hashes",)
+FIELDS = ("strings",) + INT_ARRAYS + NESTED_ARRAYS + STRING_ARRAYS
+
+""" Write the given graph (as returned by build_graph, compact or not) to filename.
+
+Args:
+    metadata:   JSON serializable dictionary stored alongside the graph.
+    binary:     Whether to use the binary format; by default it's used unless filename ends in '.json'.
+"""
+def export_graph(graph, filename, metadata=None, binary=None):
+    compact = graph if isinstance(graph, CompactGraph) else CompactGraph.from_graph(graph)
+    # CompactGraphs are left untouched; those carrying hashes already (e.g. loaded from an export) are reused
+    hashes = compact.file_hashes
+    if not hashes:
+        keyed = tree_hashes(graph.to_graph() if isinstance(graph, CompactGraph) else graph)
+        hashes = tuple(keyed[compact.file_key(file_id)] for file_id in range(compact.file_count()))
+    metadata = {} if metadata is None else metadata
+    binary = not filename.endswith(".json") if binary is None else binary
+
+    with open(filename, "wb") as file_:
+        if binary:
+            file_.write(dumps_binary(compact, metadata, hashes))
+        else:
+            file_.write(dumps_json(compact, metadata, hashes).encode("utf-8"))
+    logger.info("Exported {} launch files and {} nodes to {}".format(compact.file_count(), compact.node_count(), filename))
+
+""" Load a graph written by export_graph, detecting its format.
+
+Returns:
+    A (metadata, graph) tuple, where graph has the same layout as build_graph's output (or is a
+    CompactGraph if compact is set).
+"""
+def load_graph(filename, compact=False):
+    with open(filename, "rb") as file_:
+        data = file_.read()
+    if data.startswith(MAGIC):
+        metadata, graph = loads_binary(data)
+    else:
+        metadata, graph = loads_json(data.decode("utf-8"))
+    logger.debug("Loaded {} launch files from {}".format(graph.file_count(), filename))
+    return metadata, (graph if compact else graph.to_graph())
+
+def dumps_json(compact, metadata, file_hashes=None):
+    fields = {}
+    for name in FIELDS:
+        if name == "file_hashes":
+            fields[name] = list(compact.file_hashes if file_hashes is None else file_hashes)
+        elif name == "node_attributes":
+            fields[name] = [_flatten(pairs) for pairs in compact.node_attributes]
+        else:
+            fields[name] = [list(value) if isinstance(value, tuple) else value for value in getattr(compact, name)]
+    return json.dumps({"format": "launchalyzer", "version": VERSION, "metadata": metadata, "graph": fields}, separators=(",", ":"))
+
+def loads_json(text):
+    document = json.loads(text)
+    if document.get("format") != "launchalyzer":
+        raise RuntimeError("Not an exported launchalyzer graph.")
+    _check_version(document.get("version"))
+
+    fields = document["graph"]
+    compact = CompactGraph()
+    compact.strings = tuple(_native(string) for string in fields["strings"])
+    for name in INT_ARRAYS:
+        setattr(compact, name, array("i", fields[name]))
+    compact.child_dependencies = tuple(tuple(value) for value in fields["child_dependencies"])
+    compact.node_dependencies = tuple(tuple(value) for value in fields["node_dependencies"])
+    compact.node_attributes = tuple(_pairs(value) for value in fields["node_attributes"])
+    compact.file_hashes = tuple(_native(value) for value in fields["file_hashes"])
+    compact._ids = None
+    return document["metadata"], compact
+
+def dumps_binary(compact, metadata, file_hashes=None):
+    chunks = [MAGIC, struct.pack("<I", VERSION), _pack_string(json.dumps(metadata))]
+
+    chunks.append(struct.pack("<I", len(compact.strings)))
+    chunks.extend(_pack_string(string) for string in compact.strings)
+    for name in INT_ARRAYS:
+        chunks.append(_pack_ints(getattr(compact, name)))
+    for name in NESTED_ARRAYS:
+        values = getattr(compact, name)
+        if name == "node_attributes":
+            values = [_flatten(pairs) for pairs in values]
+        offsets = [0]
+        for value in values:
+            offsets.append(offsets[-1] + len(value))
+        chunks.append(_pack_ints(offsets))
+        chunks.append(_pack_ints([item for value in values for item in value]))
+    for name in STRING_ARRAYS:
+        values = file_hashes if name == "file_hashes" and file_hashes is not None else getattr(compact, name)
+        chunks.append(struct.pack("<I", len(values)))
+        chunks.extend(_pack_string(value) for value in values)
+    return b"".join(chunks)
+
+def loads_binary(data):
+    reader = _Reader(data)
+    reader.read(len(MAGIC))
+    _check_version(reader.unpack("<I")[0])
+    metadata = json.loads(reader.string())
+
+    compact = CompactGraph()
+    compact.strings = tuple(_native(reader.string()) for _ in range(reader.unpack("<I")[0]))
+    for name in INT_ARRAYS:
+        setattr(compact, name, reader.ints())
+    for name in NESTED_ARRAYS:
+        offsets = reader.ints()
+        flat = reader.ints()
+        values = [tuple(flat[offsets[idx]:offsets[idx + 1]]) for idx in range(len(offsets) - 1)]
+        if name == "node_attributes":
+            values = [_pairs(value) for value in values]
+        setattr(compact, name, tuple(values))
+    for name in STRING_ARRAYS:
+        setattr(compact, name, tuple(_native(reader.string()) for _ in range(reader.unpack("<I")[0])))
+    compact._ids = None
+    return metadata, compact
+
+#------------------------------------- INTERNAL FUNCTIONS ------------------------------------#
+
+def _check_version(version):
+    if version != VERSION:
+        raise RuntimeError("Unsupported exported graph version {} (expected {}).".format(version, VERSION))
+
+def _native(string):
+    # python 2 decodes to unicode; keep ASCII strings as plain str, like those of a freshly built graph
+    if isinstance(string, str):
+        return string
+    try:
+        return string.encode("ascii")
+    except UnicodeError:
+        return string
+
+def _flatten(pairs):
+    return [item for pair in pairs for item in pair]
+
+def _pairs(flat):
+    return tuple((flat[idx], flat[idx + 1]) for idx in range(0, len(flat), 2))
+
+def _pack_string(string):
+    encoded = string.encode("utf-8")
+    return struct.pack("<I", len(encoded)) + encoded
+
+def _pack_ints(values):
+    return struct.pack("<I{}i".format(len(values)), len(values), *values)
+
+class _Reader:
+    def __init__(self, data):
+        self.data = data
+        self.position = 0
+
+    def read(self, size):
+        if self.position + size > len(self.data):
+            raise RuntimeError("Exported graph is truncated.")
+        chunk = self.data[self.position:self.position + size]
+        self.position += size
+        return chunk
+
+    def unpack(self, fmt):
+        return struct.unpack(fmt, self.read(struct.calcsize(fmt)))
+
+    def string(self):
+        return self.read(self.unpack("<I")[0]).decode("utf-8")
+
+    def ints(self):
+        count = self.unpack("<I")[0]
+        return array("i", self.unpack("<{}i".format(count)))
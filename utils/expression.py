@@ -0,0 +1,98 @@
+""" Restricted compiler / evaluator of the python expressions used by $(eval ...) and if/unless conditions.
+
+Expressions are parsed once, checked against a whitelist of syntax (literals, names, boolean / arithmetic /
+comparison operators, conditional expressions, subscripts and calls to whitelisted functions or str methods)
+and compiled to a code object which is cached per expression string. Names are bound at evaluation time
+through a lookup function, so argument values are never spliced into the expression text; like roslaunch,
+they're bound as strings.
+"""
+
+import ast
+import logging
+
+logger = logging.getLogger(__name__)
+
+# syntax allowed in expressions; looked up by name since the available node types differ across python versions
+ALLOWED_NODES = frozenset([
+    "Expression", "BoolOp", "And", "Or", "UnaryOp", "Not", "USub", "UAdd", "BinOp", "Add", "Sub", "Mult",
+    "Div", "FloorDiv", "Mod", "Pow", "Compare", "Eq", "NotEq", "Lt", "LtE", "Gt", "GtE", "In", "NotIn",
+    "Is", "IsNot", "IfExp", "Call", "Name", "Load", "Num", "Str", "Constant", "NameConstant", "Tuple", "List",
+    "Attribute", "Subscript", "Index", "Slice"])
+
+# str methods expressions may call on values, e.g. arg('robots').split(',')
+ALLOWED_METHODS = frozenset([
+    "lower", "upper", "strip", "lstrip", "rstrip", "split", "rsplit", "startswith", "endswith", "replace",
+    "join", "find", "count", "capitalize", "title", "isdigit", "isalpha", "isalnum", "format"])
+
+""" Mapping used as the local namespace of evaluated expressions; resolves names through a lookup function.
+"""
+class _Namespace:
+    def __init__(self, lookup):
+        self.lookup = lookup
+
+    def __getitem__(self, name):
+        return self.lookup(name)
+
+class ExpressionCompiler:
+    def __init__(self, functions=()):
+        # names of the functions expressions are allowed to call
+        self.functions = frozenset(functions)
+
+        # compiled code objects, keyed by their expression string
+        self.code = {}
+        self.hits = 0
+        self.misses = 0
+
+    def compile(self, expression):
+        """ Return the (cached) code object of the given expression, raising RuntimeError if it isn't allowed.
+        """
+        code = self.code.get(expression)
+        if code is not None:
+            self.hits += 1
+            return code
+        self.misses += 1
+
+        try:
+            tree = ast.parse(expression.strip(), mode="eval")
+        except SyntaxError:
+            raise RuntimeError("Unable to parse expression '{}'.".format(expression))
+        self._validate(tree, expression)
+
+        code = compile(tree, "<expression>", "eval")
+        self.code[expression] = code
+        return code
+
+    def evaluate(self, expression, lookup):
+        """ Evaluate the given expression, resolving all names through lookup(name).
+
+        lookup should raise a KeyError for unknown names.
+        """
+        code = self.compile(expression)
+        try:
+            return eval(code, {"__builtins__": {}}, _Namespace(lookup))
+        except RuntimeError:
+            raise
+        except Exception as error:
+            # e.g. unknown names (KeyErrors from lookup surface as NameErrors), or operations on the wrong types
+            raise RuntimeError("Unable to evaluate '{}'; {}.".format(expression, error))
+
+    def cache_info(self):
+        """ Return statistics about the compiled expression cache.
+        """
+        return {"hits": self.hits, "misses": self.misses, "size": len(self.code)}
+
+    def _validate(self, tree, expression):
+        for node in ast.walk(tree):
+            node_type = type(node).__name__
+            if node_type not in ALLOWED_NODES:
+                raise RuntimeError("Unsupported syntax '{}' in expression '{}'.".format(node_type, expression))
+            if node_type == "Name" and node.id.startswith("__"):
+                raise RuntimeError("Unsupported name '{}' in expression '{}'.".format(node.id, expression))
+            if node_type == "Attribute" and node.attr not in ALLOWED_METHODS:
+                raise RuntimeError("Unsupported attribute '{}' in expression '{}'.".format(node.attr, expression))
+            if node_type == "Call":
+                function_type = type(node.func).__name__
+                if not (function_type == "Attribute" or (function_type == "Name" and node.func.id in self.functions)):
+                    raise RuntimeError("Unsupported function call in expression '{}'.".format(expression))
+                if node.keywords or getattr(node, "starargs", None) or getattr(node, "kwargs", None):
+                    raise RuntimeError("Unsupported function arguments in expression '{}'.".format(expression))
@@ -0,0 +1,204 @@
+""" Differences between two analyzed launch trees.
+
+Every launch file's subtree is given a Merkle hash over its path, namespace, evaluated args, nodes (with
+their attributes) and the hashes of its children. Two trees are then compared top down, pairing includes
+by (path, namespace): subtrees with the same hash are skipped without looking inside them, so all the work
+beyond hashing scales with the size of the change rather than the size of the trees.
+
+Paths below the directory of a tree's root launch file are taken relative to it, so the same tree checked
+out in two places (e.g. two commits in separate worktrees) compares equal. Exported graphs carry these
+hashes (see export.py), so comparing them doesn't hash either tree again.
+"""
+
+import os
+import json
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+""" Return the Merkle hash of every launch file's subtree in the given graph (as returned by build_graph,
+or loaded from an export), keyed by graph key.
+
+Args:
+    base:   Directory which paths are hashed relative to (if they're below it).
+"""
+def subtree_hashes(graph, base=None):
+    hashes = {}
+    for launch_file in graph.keys():
+        # iterative post-order, so a file is hashed once all of its children are
+        stack = [(launch_file, False)]
+        while stack:
+            current, expanded = stack.pop()
+            if current in hashes:
+                continue
+            children = graph[current]["object"].children
+            if expanded:
+                hashes[current] = _hash(graph[current], [hashes[child] for child in children], base)
+                continue
+            stack.append((current, True))
+            stack.extend((child, False) for child in children if child not in hashes)
+    return hashes
+
+""" Return the subtree hashes of the given graph, relative to the directory of its root (as used by diff_graphs).
+"""
+def tree_hashes(graph):
+    return subtree_hashes(graph, _base(graph, _roots(graph)))
+
+""" Compare two graphs, returning a list of changes.
+
+Each change is a dictionary with:
+    kind:       'node', 'include' or 'args'
+    change:     'added', 'removed' or 'changed'
+    file:       Path of the launch file the change was found in (the including file for includes).
+    name:       Node name, included file path or argument name.
+    namespace:  Namespace of the included file (includes only).
+    old / new:  Attributes / arguments / value before and after (changes only).
+"""
+def diff_graphs(old, new):
+    old_roots = _roots(old)
+    new_roots = _roots(new)
+    bases = (_base(old, old_roots), _base(new, new_roots))
+    hashes = (_stored_hashes(old) or subtree_hashes(old, bases[0]), _stored_hashes(new) or subtree_hashes(new, bases[1]))
+    changes = []
+    visited = set()
+
+    # the root launch files are compared whatever their names
+    if len(old_roots) == 1 and len(new_roots) == 1:
+        pairs = [(old_roots[0], new_roots[0])]
+    else:
+        pairs = _pair(old, new, bases, old_roots, new_roots, changes, None)
+    for old_key, new_key in pairs:
+        _diff_subtree(old, new, bases, hashes, old_key, new_key, changes, visited)
+
+    logger.debug("Compared {} of {} launch file pairs.".format(len(visited), min(len(old), len(new))))
+    return changes
+
+""" Format a list of changes as human readable lines, e.g. '+ node /robot/driver [/ws/robot.launch]'.
+"""
+def format_changes(changes):
+    symbols = {"added": "+", "removed": "-", "changed": "~"}
+    lines = []
+    for change in changes:
+        name = change["name"]
+        if change["kind"] == "include":
+            name = "{} (ns {})".format(name, change["namespace"])
+        line = "{} {} {} [{}]".format(symbols[change["change"]], change["kind"], name, change["file"])
+        if change["change"] == "changed":
+            line += ": {} -> {}".format(json.dumps(change["old"], sort_keys=True, default=str), json.dumps(change["new"], sort_keys=True, default=str))
+        lines.append(line)
+    return lines
+
+#------------------------------------- INTERNAL FUNCTIONS ------------------------------------#
+
+def _node_attributes(node):
+    # normalized through JSON, so freshly built and loaded nodes compare (and hash) alike
+    return json.loads(json.dumps(dict(node.xmlattrs()), sort_keys=True, default=str))
+
+def _relative(path, base):
+    if base and path.startswith(base + os.sep):
+        return path[len(base) + 1:]
+    return path
+
+def _base(graph, roots):
+    return os.path.dirname(graph[roots[0]]["object"].fullpath) if len(roots) == 1 else None
+
+def _hash(entry, child_hashes, base):
+    launch_file = entry["object"]
+    nodes = sorted((node.namespace + node.name, _node_attributes(node)) for node in entry["nodes"])
+    contents = [_relative(launch_file.fullpath, base), launch_file.namespace, sorted(launch_file.args.items()), nodes, child_hashes]
+    return hashlib.sha1(json.dumps(contents, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+def _stored_hashes(graph):
+    # graphs loaded from an export carry the hashes computed when it was written
+    if not graph or any("hash" not in entry for entry in graph.values()):
+        return None
+    return dict((key, entry["hash"]) for key, entry in graph.items())
+
+def _roots(graph):
+    return [key for key, value in graph.items() if value["object"].parent is None]
+
+def _pair(old, new, bases, old_keys, new_keys, changes, parent):
+    # match includes by (relative path, namespace), in order; everything unmatched was added / removed
+    unmatched = {}
+    for key in new_keys:
+        launch_file = new[key]["object"]
+        unmatched.setdefault((_relative(launch_file.fullpath, bases[1]), launch_file.namespace), []).append(key)
+
+    pairs = []
+    for key in old_keys:
+        launch_file = old[key]["object"]
+        candidates = unmatched.get((_relative(launch_file.fullpath, bases[0]), launch_file.namespace))
+        if candidates:
+            pairs.append((key, candidates.pop(0)))
+        else:
+            _report_subtree(old, key, "removed", changes, parent)
+    for keys in unmatched.values():
+        for key in keys:
+            _report_subtree(new, key, "added", changes, parent)
+    return pairs
+
+def _report_subtree(graph, key, change, changes, parent):
+    # an include added / removed along with every node it (transitively) launches
+    launch_file = graph[key]["object"]
+    changes.append({"kind": "include", "change": change, "file": parent, "name": launch_file.fullpath, "namespace": launch_file.namespace})
+    stack = [key]
+    seen = set()
+    while stack:
+        current = stack.pop()
+        if current in seen:
+            continue
+        seen.add(current)
+        for node in graph[current]["nodes"]:
+            changes.append({"kind": "node", "change": change, "file": graph[current]["object"].fullpath, "name": node.namespace + node.name})
+        stack.extend(reversed(graph[current]["object"].children))
+
+def _diff_subtree(old, new, bases, hashes, old_key, new_key, changes, visited):
+    stack = [(old_key, new_key)]
+    while stack:
+        old_key, new_key = stack.pop()
+        if (old_key, new_key) in visited:
+            continue
+        visited.add((old_key, new_key))
+        if hashes[0][old_key] == hashes[1][new_key]:
+            continue
+
+        old_file = old[old_key]["object"]
+        new_file = new[new_key]["object"]
+        path = new_file.fullpath
+
+        # arguments
+        for name in sorted(set(old_file.args.keys()) | set(new_file.args.keys())):
+            before, after = old_file.args.get(name), new_file.args.get(name)
+            if before == after:
+                continue
+            change = "added" if before is None else "removed" if after is None else "changed"
+            entry = {"kind": "args", "change": change, "file": path, "name": name}
+            if change == "changed":
+                entry["old"], entry["new"] = before, after
+            changes.append(entry)
+
+        # nodes
+        old_nodes = dict((node.namespace + node.name, node) for node in old[old_key]["nodes"])
+        new_nodes = dict((node.namespace + node.name, node) for node in new[new_key]["nodes"])
+        for name in sorted(set(old_nodes.keys()) | set(new_nodes.keys())):
+            if name not in new_nodes:
+                changes.append({"kind": "node", "change": "removed", "file": path, "name": name})
+            elif name not in old_nodes:
+                changes.append({"kind": "node", "change": "added", "file": path, "name": name})
+            else:
+                before, after = _node_attributes(old_nodes[name]), _node_attributes(new_nodes[name])
+                if before != after:
+                    changed = sorted(attribute for attribute in set(before.keys()) | set(after.keys()) if before.get(attribute) != after.get(attribute))
+                    changes.append({"kind": "node", "change": "changed", "file": path, "name": name,
+                                    "old": dict((attribute, before.get(attribute)) for attribute in changed),
+                                    "new": dict((attribute, after.get(attribute)) for attribute in changed)})
+
+        # includes; pairs with different input arguments are reported, and compared further down
+        pairs = _pair(old, new, bases, old_file.children, new_file.children, changes, path)
+        for old_child, new_child in pairs:
+            before, after = old[old_child]["object"].input_arguments, new[new_child]["object"].input_arguments
+            if before != after:
+                changes.append({"kind": "include", "change": "changed", "file": path, "name": new[new_child]["object"].fullpath,
+                                "namespace": new[new_child]["object"].namespace, "old": before, "new": after})
+        stack.extend(reversed(pairs))
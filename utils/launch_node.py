@@ -0,0 +1,70 @@
+""" Lightweight description of a node, evaluated directly from a launch file's 'node' element.
+
+This mirrors the attributes of roslaunch.core.Node that we care about, without loading the whole launch
+tree (and all its parameters) through roslaunch.
+"""
+
+class LaunchNode:
+    # (XML attribute, Node attribute, default) for all the node attributes we evaluate
+    ATTRIBUTES = (
+        ("pkg", "package", None),
+        ("type", "type", None),
+        ("machine", "machine_name", None),
+        ("args", "args", ""),
+        ("output", "output", None),
+        ("respawn", "respawn", "false"),
+        ("required", "required", "false"),
+        ("launch-prefix", "launch_prefix", None))
+
+    def __init__(self, name, namespace="/", remap_args=None, **attributes):
+        self.name = name
+        self.namespace = namespace
+        self.remap_args = [] if remap_args is None else [tuple(remap) for remap in remap_args]
+        for _, attribute, default in self.ATTRIBUTES:
+            setattr(self, attribute, attributes.get(attribute, default))
+
+        # roslaunch stores these as booleans
+        for flag in ("respawn", "required"):
+            if not isinstance(getattr(self, flag), bool):
+                setattr(self, flag, getattr(self, flag).lower() == "true")
+
+    """Construct a LaunchNode from the given 'node' element, evaluating its attributes.
+
+    Args:
+        element:    The XML 'node' element.
+        namespace:  The resolved namespace the node is launched in.
+        evaluate:   Function evaluating substitution args in an attribute string.
+    """
+    @classmethod
+    def from_element(cls, element, namespace, evaluate):
+        attributes = {}
+        for xml_attribute, attribute, _ in cls.ATTRIBUTES:
+            if xml_attribute in element.attrib:
+                attributes[attribute] = evaluate(element.attrib[xml_attribute])
+
+        remap_args = []
+        for remap in element.findall("remap"):
+            remap_args.append((evaluate(remap.attrib["from"]), evaluate(remap.attrib["to"])))
+
+        return cls(evaluate(element.attrib["name"]), namespace, remap_args, **attributes)
+
+    """Construct a LaunchNode from a dictionary created by to_dict.
+    """
+    @classmethod
+    def from_dict(cls, dictionary):
+        attributes = dict((str(key), value) for key, value in dictionary.items())
+        return cls(**attributes)
+
+    def to_dict(self):
+        dictionary = {"name": self.name, "namespace": self.namespace, "remap_args": self.remap_args}
+        for _, attribute, _ in self.ATTRIBUTES:
+            dictionary[attribute] = getattr(self, attribute)
+        return dictionary
+
+    def xmlattrs(self):
+        # same layout as roslaunch.core.Node.xmlattrs
+        attributes = [("name", self.name), ("ns", self.namespace)]
+        for xml_attribute, attribute, _ in self.ATTRIBUTES:
+            attributes.append((xml_attribute, getattr(self, attribute)))
+        attributes.append(("remap", self.remap_args))
+        return attributes
@@ -0,0 +1,141 @@
+""" Index of ROS package locations, used to resolve $(find) substitution args.
+
+Building the index crawls ROS_ROOT / ROS_PACKAGE_PATH for package manifests once, the same way rospkg
+does. The result can be saved to disk and reloaded by later (or concurrent) runs; it is invalidated
+whenever the search paths change or any crawled directory or manifest is modified.
+"""
+
+import os
+import json
+import logging
+import xml.etree.ElementTree as ET
+
+from cache import write_json
+
+logger = logging.getLogger(__name__)
+
+class PackageIndex:
+    # bump whenever the layout of saved indices changes
+    VERSION = 1
+
+    # files marking a directory as a package; the first found wins
+    MANIFESTS = ("package.xml", "manifest.xml")
+
+    # files marking a directory (and its subdirectories) as ignored
+    IGNORE_MARKERS = ("CATKIN_IGNORE", "rospack_nosubdirs")
+
+    def __init__(self, paths=None, packages=None, mtimes=None):
+        self.paths = self.ros_paths() if paths is None else list(paths)
+        self.packages = {} if packages is None else packages
+        self.mtimes = {} if mtimes is None else mtimes
+
+    @staticmethod
+    def ros_paths():
+        """ Return the package search paths of the current environment, in order of precedence.
+        """
+        paths = [path for path in os.environ.get("ROS_PACKAGE_PATH", "").split(os.pathsep) if path]
+        if os.environ.get("ROS_ROOT"):
+            paths.append(os.environ["ROS_ROOT"])
+        return paths
+
+    @staticmethod
+    def default_file():
+        """ Return where the index is saved when there's no cache directory: the per-user cache directory
+        ($XDG_CACHE_HOME, or ~/.cache), so runs without one don't each crawl the package paths again.
+        """
+        directory = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+        return os.path.join(directory, "launchalyzer", "packages.json")
+
+    """Load the index saved at the given file, rebuilding (and saving) it if it's missing or out of date.
+    """
+    @classmethod
+    def load(cls, filename):
+        paths = cls.ros_paths()
+        try:
+            with open(filename) as file_:
+                saved = json.load(file_)
+            if saved["version"] == cls.VERSION and saved["paths"] == paths:
+                index = cls(paths, saved["packages"], saved["mtimes"])
+                if index.is_valid():
+                    logger.debug("Loaded package index {}.".format(filename))
+                    return index
+        except (IOError, OSError, ValueError, KeyError):
+            pass
+
+        logger.info("Building package index of {}.".format(os.pathsep.join(paths)))
+        index = cls(paths)
+        index.crawl()
+        directory = os.path.dirname(filename)
+        try:
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory)
+        except OSError:
+            pass
+        if not write_json(filename, index.to_dict()):
+            logger.warning("Failed to save package index to {}.".format(filename))
+        return index
+
+    def to_dict(self):
+        return {"version": self.VERSION, "paths": self.paths, "packages": self.packages, "mtimes": self.mtimes}
+
+    def is_valid(self):
+        """ Check that none of the crawled directories or manifests have been modified since crawling.
+        """
+        for path, mtime in self.mtimes.items():
+            try:
+                if os.stat(path).st_mtime != mtime:
+                    return False
+            except OSError:
+                return False
+        return True
+
+    def crawl(self):
+        """ Find all packages on our search paths.
+        """
+        self.packages = {}
+        self.mtimes = {}
+        for path in self.paths:
+            self._crawl(os.path.abspath(path))
+        return self.packages
+
+    def get_path(self, package):
+        """ Return the directory of the given package, raising KeyError if it can't be found.
+        """
+        return self.packages[package]
+
+    def _crawl(self, directory):
+        try:
+            self.mtimes[directory] = os.stat(directory).st_mtime
+            entries = os.listdir(directory)
+        except OSError:
+            return
+
+        if any(marker in entries for marker in self.IGNORE_MARKERS):
+            return
+
+        # packages don't contain other packages, so stop descending once we find a manifest
+        for manifest in self.MANIFESTS:
+            if manifest in entries:
+                filename = os.path.join(directory, manifest)
+                self.mtimes[filename] = os.stat(filename).st_mtime
+                name = self._package_name(filename)
+                # packages earlier on the search path take precedence
+                if name not in self.packages:
+                    self.packages[name] = directory
+                return
+
+        for entry in sorted(entries):
+            subdirectory = os.path.join(directory, entry)
+            if not entry.startswith(".") and os.path.isdir(subdirectory):
+                self._crawl(subdirectory)
+
+    def _package_name(self, filename):
+        # catkin packages declare their name in package.xml; rosbuild packages are named after their directory
+        if os.path.basename(filename) == "package.xml":
+            try:
+                name = ET.parse(filename).getroot().findtext("name")
+                if name:
+                    return name.strip()
+            except ET.ParseError:
+                logger.warning("Failed to parse package manifest {}.".format(filename))
+        return os.path.basename(os.path.dirname(filename))
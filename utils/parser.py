@@ -1,23 +1,163 @@
 """ Module of classes / functions for parsing launch files.
-
-@TODO figure out what to do if our keys (full launch file path) are non-unique (which they might be?)
 """
 
 import os
-import re
 import copy
-import argparse
+import atexit
 import logging
-from collections import defaultdict
+import json
+import bisect
+import hashlib
+import threading
+from collections import defaultdict, OrderedDict
 import xml.etree.ElementTree as ET
+try:
+    import Queue
+except ImportError:
+    import queue as Queue
 
-from roslaunch.config import ROSLaunchConfig
-from roslaunch.xmlloader import XmlLoader
-
+import profiler
 from substitution_args import SubstitutionArgs
+from package_index import PackageIndex
+from cache import AnalysisCache
+from launch_node import LaunchNode
+from dependencies import TrackedArguments
+from compact_graph import CompactGraph
 
 logger = logging.getLogger(__name__)
 
+# errors from building the graph of a malformed or missing launch file (XML ParseErrors are SyntaxErrors)
+BUILD_ERRORS = (RuntimeError, KeyError, IOError, OSError, SyntaxError)
+
+""" Return the key identifying an instantiation of a launch file, i.e. the file launched in a namespace with
+a set of input arguments. Identical instantiations share a key, distinct ones never do.
+"""
+def instance_key(fullpath, namespace, input_arguments):
+    digest = hashlib.sha1(json.dumps(input_arguments, sort_keys=True).encode("utf-8")).hexdigest()
+    return "{}@{}#{}".format(fullpath, namespace, digest[:8])
+
+""" Cache of parsed launch file XML, shared by all LaunchFile instances (and all graphs built in this process).
+
+Entries are keyed by file path and invalidated whenever the file's modification time or size changes; the
+least recently used entries are dropped once there are more than max_entries.
+
+Files can be prefetched, i.e. read and parsed by a pool of background threads, as soon as we know they'll
+be needed (e.g. once an include's path is resolved), so their I/O overlaps with the evaluation of the
+file including them. get() waits for a pending prefetch of the file rather than reading it again.
+"""
+class XmlCache:
+    def __init__(self, max_entries=1024, workers=4):
+        self.max_entries = max_entries
+        self.workers = workers
+        self.trees = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.prefetched = 0
+        self._reset_threads()
+
+    """Return the root element of the given file; contents may be supplied if they've already been read.
+    """
+    def get(self, fullpath, contents=None):
+        self._check_fork()
+        with self.lock:
+            pending = self.pending.get(fullpath)
+        if pending is not None:
+            pending.wait()
+
+        status = os.stat(fullpath)
+        signature = (status.st_mtime, status.st_size)
+        with self.lock:
+            entry = self.trees.pop(fullpath, None)
+            if entry is not None and entry[0] == signature:
+                self.hits += 1
+                self.trees[fullpath] = entry
+                return entry[1]
+            self.misses += 1
+
+        xml_context = ET.parse(fullpath).getroot() if contents is None else ET.fromstring(contents)
+        self._store(fullpath, signature, xml_context)
+        return xml_context
+
+    """Start reading and parsing the given file in the background, unless it's already cached or pending.
+    """
+    def prefetch(self, fullpath):
+        if not self.workers:
+            return
+        self._check_fork()
+        with self.lock:
+            if fullpath in self.trees or fullpath in self.pending:
+                return
+            self.pending[fullpath] = threading.Event()
+            if not self.threads:
+                for _ in range(self.workers):
+                    thread = threading.Thread(target=self._prefetch_worker, name="xml-prefetch")
+                    thread.daemon = True
+                    thread.start()
+                    self.threads.append(thread)
+                # stop the workers before the interpreter starts tearing down the modules they're using
+                atexit.register(self.shutdown)
+        self.queue.put(fullpath)
+
+    def discard(self, fullpath):
+        with self.lock:
+            self.trees.pop(fullpath, None)
+
+    """Stop the prefetching threads, skipping any files still queued.
+    """
+    def shutdown(self):
+        with self.lock:
+            threads, self.threads = self.threads, []
+            self.stopping = True
+        for _ in threads:
+            self.queue.put(None)
+        for thread in threads:
+            thread.join()
+        self.stopping = False
+
+    #------------------------------------- INTERNAL FUNCTIONS ------------------------------------#
+
+    def _store(self, fullpath, signature, xml_context):
+        with self.lock:
+            self.trees.pop(fullpath, None)
+            self.trees[fullpath] = (signature, xml_context)
+            while self.max_entries is not None and len(self.trees) > self.max_entries:
+                self.trees.popitem(last=False)
+
+    def _prefetch_worker(self):
+        while True:
+            fullpath = self.queue.get()
+            if fullpath is None:
+                return
+            try:
+                if self.stopping:
+                    continue
+                status = os.stat(fullpath)
+                with open(fullpath, "rb") as file_:
+                    contents = file_.read()
+                self._store(fullpath, (status.st_mtime, status.st_size), ET.fromstring(contents))
+                with self.lock:
+                    self.prefetched += 1
+            except Exception:
+                # get() will read the file again, and report any error in context; the worker must survive, or
+                # files queued behind this one would never be marked as done
+                logger.debug("Failed to prefetch {}".format(fullpath))
+            finally:
+                with self.lock:
+                    self.pending.pop(fullpath).set()
+
+    def _reset_threads(self):
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.queue = Queue.Queue()
+        self.threads = []
+        self.stopping = False
+        self.pid = os.getpid()
+
+    def _check_fork(self):
+        # a forked worker process (see build_graph) inherits our state, but not our threads
+        if self.pid != os.getpid():
+            self._reset_threads()
+
 """ Class to store directional information about launch files (i.e. Network Graph representation).
 
 This class also contains and API to parse for child launch files (found via the 'include' tag) and
@@ -26,19 +166,52 @@ all input and contextual arguments.
 """
 class LaunchFile:
     substituter = None
+    cache = None
+    memo = None
+    cache_dir = None
+    xml_cache = None
     initialized = False
 
-    """Set class variables; this should be called once and only once before any instances are instantiated.
+    """Set class variables; this must be called before any instances are instantiated.
+
+    Calling it again with the same configuration is a no-op, so the substituter (and its package index)
+    and the parsed XML cache are shared by every graph built in this process.
+
+    Args:
+        cache_dir:  Optional directory of a persistent AnalysisCache of evaluated launch files, which is
+                        also where the package index used to resolve $(find) is saved (otherwise it's saved
+                        to PackageIndex.default_file()).
     """
     @classmethod
-    def initialize(cls):
-        if cls.initialized:
-            raise RuntimeError("Initialize called on already initialized LaunchFile")
+    def initialize(cls, cache_dir=None):
+        if cls.initialized and cls.cache_dir == cache_dir:
+            return
         
-        cls.substituter = SubstitutionArgs()
+        cls.cache_dir = cache_dir
+        cls.cache = AnalysisCache(cache_dir) if cache_dir else None
+        cls.substituter = SubstitutionArgs(os.path.join(cls.cache.directory, "packages.json") if cls.cache else PackageIndex.default_file())
+        if cls.xml_cache is None:
+            cls.xml_cache = XmlCache()
         cls.initialized = True
 
-    def __init__(self, fullpath, parent=None, input_arguments=None, namespace="/"):
+    """Return the hit / miss statistics of all caches shared by LaunchFile instances, keyed by name.
+    """
+    @classmethod
+    def cache_info(cls):
+        info = {}
+        if cls.xml_cache is not None:
+            info["xml.hits"], info["xml.misses"] = cls.xml_cache.hits, cls.xml_cache.misses
+            info["xml.prefetched"] = cls.xml_cache.prefetched
+        if cls.substituter is not None:
+            for name, cache in (("templates", cls.substituter.cache_info()), ("expressions", cls.substituter.expressions.cache_info())):
+                info[name + ".hits"], info[name + ".misses"] = cache["hits"], cache["misses"]
+        if cls.cache is not None:
+            info["analysis.hits"], info["analysis.misses"] = cls.cache.hits, cls.cache.misses
+        if cls.memo is not None:
+            info["memo.hits"], info["memo.misses"] = cls.memo.hits, cls.memo.misses
+        return info
+
+    def __init__(self, fullpath, parent=None, input_arguments=None, namespace="/", record=None):
         # sanity check that fullpath is a real file
         if not os.path.isfile(fullpath):
             raise RuntimeError("Unable to find launch file {}".format(fullpath))
@@ -49,130 +222,311 @@ class LaunchFile:
         self.path = os.path.dirname(fullpath)
         self.namespace = namespace
 
-        # Node graph information
+        # Node graph information (parent and children are instance keys, see instance_key)
         self.parent = parent
         self.children = None
+        self.nodes = None
+        self.launch_nodes = None
 
-        # get the XML object representation of this file 
-        self.xml_context = self._get_xml_context()
-
-        # parse arguments; incoming and internal. This is necessary to properly evaluate all substitution arguments in the file.
         self.input_arguments = {} if input_arguments is None else input_arguments
-        logger.debug("Parsing top level arguments for {}".format(self.name))
-        self.args = self.parse_arguments(self.xml_context, self.input_arguments, inputs=True)
-
-    """Determine all the top level arguments of this launch file, as well as those sent via the parent.
+        self.key = instance_key(self.fullpath, self.namespace, self.input_arguments)
+        self.xml_context = None
+        self._children = None
+        self.environment = {}
+        self.packages = {}
+
+        # names of the input arguments this file's evaluation read, and of the arguments each node depends on
+        self.input_dependencies = set()
+        self.node_dependencies = {}
+
+        # names of the declared inputs whose value is taken from the input if it's supplied; unless read, only
+        # whether they were supplied matters (see _argument_callback)
+        self.input_presence = set()
+
+        # the file has already been evaluated elsewhere (e.g. by a worker process, or with inputs that
+        # agree on everything this file depends on)
+        if record is None and self.memo is not None:
+            record = self.memo.lookup(self.fullpath, self.namespace, self.input_arguments)
+        if record is not None:
+            self._load_record(record)
+            return
+
+        if self.cache is None and self.memo is None:
+            self._evaluate()
+            return
+
+        # reuse the results of a previous evaluation of this exact file with the same inputs, if we have one
+        key = None
+        contents = None
+        if self.cache is not None:
+            with open(self.fullpath, "rb") as file_:
+                contents = file_.read()
+            key = self.cache.key(contents, self.input_arguments, self.namespace)
+            record = self.cache.get(key, self.substituter.find_package)
+
+        if record is not None:
+            logger.debug("Loaded {} from cache.".format(self.name))
+            self._load_record(record)
+        else:
+            # cached records need the nodes and children too, so evaluate everything up front
+            self._evaluate(contents)
+            record = self.to_record()
+            if self.cache is not None:
+                self.cache.put(key, record)
+
+        if self.memo is not None:
+            self.memo.store(self.fullpath, self.namespace, self.input_arguments, self.input_dependencies, record, self.input_presence)
+
+    """Return the evaluated contents of this launch file as a JSON serializable dictionary.
     """
-    def parse_arguments(self, xml_to_parse, arg_context, inputs=False):
-        # callback performed upon elements that match the 'arg' tag.
-        def parsing_callback(arg, arguments, namespace):
-            name = arg.attrib["name"]
-            input_arg = arg_context[name] if name in arg_context.keys() else None
+    def to_record(self):
+        self.get_nodes()
+        self.get_children()
+        if isinstance(self.args, TrackedArguments):
+            # inputs passed along into our args are dependencies once anything actually reads them
+            self.input_dependencies |= self.args.reads & self.input_presence
+        return {
+            "args": self.args,
+            "nodes": [node.to_dict() for node in self.launch_nodes],
+            "children": [[child["path"], child["namespace"], child["args"], child["dependencies"]] for child in self.get_children().values()],
+            "environment": self.environment,
+            "packages": self.packages,
+            "input_dependencies": sorted(self.input_dependencies),
+            "input_presence": sorted(self.input_presence),
+            "node_dependencies": self.node_dependencies}
+
+    """Walk this launch file's XML once, collecting arguments, nodes and includes.
+
+    Group conditions and namespaces are evaluated a single time against the arguments declared so far (which
+    take precedence over the inputs they're resolved from, as they would once the whole file is parsed); nodes
+    and includes are only recorded (with their namespace and the arguments their conditions read) since
+    their attributes may depend on arguments that are defined further down the file.
+    """
+    def parse(self, input_arguments=None):
+        input_arguments = self.input_arguments if input_arguments is None else input_arguments
+        node_elements = []
+        include_elements = []
 
-            # interpret arg based on default / value tags
-            if "default" in arg.attrib.keys():
-                value = input_arg if input_arg else arg.attrib["default"]
-            elif "value" in arg.attrib.keys():
-                # warn if we passed an argument that will be unused
-                if input_arg and inputs:
-                    logger.warning("Argument '{}' passed to '{}' is unused.".format(name, self.name))
-                value = arg.attrib["value"]
-            else:
-                # no default, this must be an input
-                if not input_arg:
-                    raise RuntimeError("Argument '{}' required in '{}' not supplied.".format(name, self.name))
-                value = input_arg
-        
-            arguments[name] = self.substituter.evaluate(value, arg_context, arguments)
+        def node_callback(node, parsed, namespace, dependencies):
+            node_elements.append((node, namespace, dependencies))
 
+        def include_callback(child_element, parsed, namespace, dependencies):
+            include_elements.append((child_element, namespace, dependencies))
+
+        callbacks = {
+            "arg": self._argument_callback(input_arguments, inputs=True),
+            "node": node_callback,
+            "include": include_callback}
+
+        # convenience object to set up parsing configuration parameters
+        config = self.RecursiveParseConfig(
+            primary_context=input_arguments,
+            callbacks=callbacks,
+            namespace=self.namespace,
+            use_secondary_context=True,
+            secondary_context_first=True)
+
+        # tracked, so inputs only read through the args declared from them still count as dependencies
+        parsed_arguments = self.recursive_parse(config, self.xml_context, TrackedArguments())
+        return parsed_arguments, node_elements, include_elements
+
+    """Determine all the top level arguments of the given XML, as well as those sent via the parent.
+    """
+    def parse_arguments(self, xml_to_parse, arg_context, inputs=False):
         # convenience object to set up parsing configuration parameters
         config = self.RecursiveParseConfig(
             primary_context=arg_context,
-            tag="arg",
+            callbacks={"arg": self._argument_callback(arg_context, inputs)},
             namespace=self.namespace,
-            callback=parsing_callback,
             use_secondary_context=True)
 
         parsed_arguments = self.recursive_parse(config, xml_to_parse, {})
         return parsed_arguments
 
-    """Parse this launch files XML and return the element/fullpath of all child nodes.
+    """Return the fully resolved names of all nodes spawned by this launch file.
+
+    The nodes' evaluated attributes (package, type, args, remaps, ...) are available as LaunchNode
+    objects in launch_nodes afterwards.
     """
     def get_nodes(self):
-        logger.debug("Getting nodes spawned by {}".format(self.name))
-
-        def parsing_callback(node, nodes, namespace):
-            name = self.substituter.evaluate(node.attrib["name"], self.args)
-            nodes.append(namespace + name)
-
-        # convenience object to set up parsing configuration parameters
-        config = self.RecursiveParseConfig(
-            primary_context=self.args,
-            tag="node",
-            namespace=self.namespace,
-            callback=parsing_callback)
+        if self.nodes is not None:
+            return self.nodes
 
-        parsed_nodes = self.recursive_parse(config, self.xml_context, [])
-        self.nodes = parsed_nodes
-        return parsed_nodes
-
-    """Parse this launch files XML and return the element/fullpath of all child launch files.
+        logger.debug("Getting nodes spawned by {}".format(self.name))
+        evaluate = lambda string: self.substituter.evaluate(string, self.args, {})
+        def _get_nodes():
+            nodes = []
+            for node, namespace, dependencies in self._node_elements:
+                with self.substituter.recording_arguments() as read:
+                    nodes.append(LaunchNode.from_element(node, namespace, evaluate))
+                self.node_dependencies[nodes[-1].namespace + nodes[-1].name] = sorted(dependencies | read)
+            return nodes
+
+        with profiler.span(self.fullpath, "launch_file", step="nodes", namespace=self.namespace):
+            self.launch_nodes = self._recording_environment(_get_nodes)
+        self.nodes = [node.namespace + node.name for node in self.launch_nodes]
+        return self.nodes
+
+    """Return the path, namespace and input arguments of all child launch files, keyed by instance key.
+
+    Including the same file in the same namespace with the same arguments more than once yields one child.
     """
     def get_children(self):
+        if self._children is not None:
+            return self._children
 
         logger.debug("Getting children of {}".format(self.name))
+        def _get_children():
+            children = OrderedDict()
+            for child_element, namespace, dependencies in self._include_elements:
+                # get file name (relative path)
+                if not "file" in child_element.attrib.keys():
+                    raise KeyError("Unable to find 'file' attribute for an include in {};".format(self.fullpath))
+
+                file_ = copy.copy(child_element.attrib["file"])
+                with self.substituter.recording_arguments() as read:
+                    path = self.substituter.evaluate(file_, self.args)
+                self.xml_cache.prefetch(path)
+
+                logger.debug("Parsing input arguments for {}".format(path))
+                args = self.parse_arguments(child_element, self.args, inputs=False)
+
+                children[instance_key(path, namespace, args)] = {
+                    "path": path,
+                    "namespace": namespace,
+                    "element": child_element,
+                    "dependencies": sorted(dependencies | read),
+                    "args": args}
+
+                logger.debug("Added child {} to {}".format(file_, self.name))
+            return children
+
+        with profiler.span(self.fullpath, "launch_file", step="children", namespace=self.namespace):
+            self._children = self._recording_environment(_get_children)
+        self.children = list(self._children.keys())
+        return self._children
+
+    """Drop the XML (and parse state) of this file once its contents have been fully evaluated.
+    """
+    def release(self):
+        self.get_nodes()
+        self.get_children()
+        self.xml_context = None
+        self._node_elements = None
+        self._include_elements = None
+        for child in self._children.values():
+            child["element"] = None
+        self.xml_cache.discard(self.fullpath)
 
-        def parsing_callback(child_element, children, namespace):
-            # get file name (relative path)
-            if not "file" in child_element.attrib.keys():
-                raise KeyError("Unable to find 'file' attribute for an include in {};".format(self.fullpath))
-        
-            file_ = copy.copy(child_element.attrib["file"])
-            path = self.substituter.evaluate(file_, self.args)
-
-            children[path]["namespace"] = namespace
-            children[path]["element"] = child_element
-
-            logger.debug("Parsing input arguments for {}".format(path))
-            children[path]["args"] = self.parse_arguments(child_element, self.args, inputs=False)
+    #------------------------------------- INTERNAL FUNCTIONS ------------------------------------#
 
-            logger.debug("Added child {} to {}".format(file_, self.name))
+    def _evaluate(self, contents=None):
+        with profiler.span(self.fullpath, "launch_file", step="parse", namespace=self.namespace):
+            # get the XML object representation of this file 
+            self.xml_context = self._get_xml_context(contents)
+
+            # parse arguments; incoming and internal. This is necessary to properly evaluate all substitution arguments in the file.
+            # the same pass also collects the (namespaced) node and include elements, which are evaluated on request.
+            logger.debug("Parsing {}".format(self.name))
+            tracked_arguments = TrackedArguments(self.input_arguments)
+            self.args, self._node_elements, self._include_elements = self._recording_environment(lambda: self.parse(tracked_arguments))
+            self.input_dependencies = tracked_arguments.reads
+
+    def _load_record(self, record):
+        self.args = dict(record["args"])
+        self.launch_nodes = [LaunchNode.from_dict(node) for node in record["nodes"]]
+        self.nodes = [node.namespace + node.name for node in self.launch_nodes]
+        self.environment = record["environment"]
+        self.packages = record["packages"]
+        self.input_dependencies = set(record["input_dependencies"])
+        self.input_presence = set(record["input_presence"])
+
+        # the record may come from an evaluation with other values of the inputs we only passed along
+        for name in self.input_presence - self.input_dependencies:
+            if self.input_arguments.get(name):
+                self.args[name] = self.input_arguments[name]
+        self.node_dependencies = record["node_dependencies"]
+        self._children = OrderedDict()
+        for path, namespace, args, dependencies in record["children"]:
+            self._children[instance_key(path, namespace, args)] = {
+                "path": path,
+                "namespace": namespace,
+                "element": None,
+                "dependencies": dependencies,
+                "args": args}
+        self.children = list(self._children.keys())
+
+    def _recording_environment(self, function):
+        # keep track of the environment variables and packages read while evaluating this file (for cache validation)
+        previous = self.substituter.environment, self.substituter.packages
+        self.substituter.environment, self.substituter.packages = self.environment, self.packages
+        try:
+            return function()
+        finally:
+            self.substituter.environment, self.substituter.packages = previous
+
+    """Construct the parsing callback performed upon elements that match the 'arg' tag.
 
-        # set up configuration parameters for parser
-        config = self.RecursiveParseConfig(
-            primary_context=self.args,
-            tag="include",
-            namespace=self.namespace,
-            callback=parsing_callback)
+    Args:
+        arg_context:    The arguments passed into the XML being parsed (e.g. from a parent launch file).
+        inputs:         Whether these are the top level arguments of this file (used to warn about unused inputs).
+    """
+    def _argument_callback(self, arg_context, inputs):
+        def parsing_callback(arg, arguments, namespace, dependencies):
+            name = arg.attrib["name"]
+            # not recorded as a read (see TrackedArguments) yet: the value may not be used, or only passed along
+            input_arg = dict.get(arg_context, name)
 
-        elements = defaultdict(lambda: {"element": None, "args": None, "namespace": None})
-        parsed_children = self.recursive_parse(config, self.xml_context, elements)
-        self.children = list(parsed_children.keys())
-        return parsed_children
+            # interpret arg based on default / value tags
+            if "default" in arg.attrib.keys():
+                value = input_arg if input_arg else arg.attrib["default"]
+                if inputs:
+                    self.input_presence.add(name)
+            elif "value" in arg.attrib.keys():
+                # warn if we passed an argument that will be unused
+                if input_arg and inputs:
+                    logger.warning("Argument '{}' passed to '{}' is unused.".format(name, self.name))
+                value = arg.attrib["value"]
+            else:
+                # no default, this must be an input
+                if inputs:
+                    self.input_presence.add(name)
+                if not input_arg:
+                    raise RuntimeError("Argument '{}' required in '{}' not supplied.".format(name, self.name))
+                value = input_arg
 
-    #------------------------------------- INTERNAL FUNCTIONS ------------------------------------#
+            # an input copied verbatim into our args is only read once something reads that arg (see to_record)
+            if input_arg and value is input_arg and (not inputs or "$(" in input_arg):
+                arg_context.get(name)
+            arguments[name] = self.substituter.evaluate(value, arg_context, arguments)
+        return parsing_callback
 
     """ Convenience object to set up parsing configuration parameters
 
     Args:
         primary_context:        A dictionary containing the substitution arguments to evaluate against.
-        tag:                    The tag of elements which we wish to evaluate.
-        callback:               Parsing callback called whenever we encounter an element that has the tag we're looking for.
+        callbacks:              Dictionary of element tag to the parsing callback called whenever we encounter an
+                                    element with that tag. Callbacks are passed the element, the data structure
+                                    being built, the element's namespace and the names of all arguments its
+                                    (and its enclosing groups') if/unless/ns attributes read.
         namespace:              The starting namespace of the XML object.
         secondary_tags:         Any XML Element tags that shouldn't be parsed but also shouldn't be skipped, e.g. "group".
         use_secondary_context:  A Flag that tells any substitution arg evaluations to use the data structure
                                     (elements) we're constructing as a local context for substitution arguments.
+        secondary_context_first: A Flag that tells if/unless/ns evaluations to look arguments up in the local
+                                    context before the primary one.
     """
     class RecursiveParseConfig:
-        def __init__(self, primary_context, tag, callback, namespace, secondary_tags=["group"], use_secondary_context=False):
+        def __init__(self, primary_context, callbacks, namespace, secondary_tags=["group"], use_secondary_context=False,
+                     secondary_context_first=False):
             self.primary_context = primary_context
-            self.primary_tag = tag
+            self.callbacks = callbacks
             self.secondary_tags = secondary_tags
             self.namespace = namespace
-            self.callback = callback
             self.use_secondary_context = use_secondary_context
+            self.secondary_context_first = secondary_context_first
 
-    """ Traverse a given XML object and return all the matching 'tags' that satisfy our if/unless conditions.
+    """ Traverse a given XML object and call back on all the matching 'tags' that satisfy our if/unless conditions.
 
     Args:
         config:         Struct of class RecursiveParseConfig containing search parameters.
@@ -183,49 +537,53 @@ class LaunchFile:
         if not isinstance(config, self.RecursiveParseConfig):
             raise RuntimeError("Config must be of class type 'RecursiveParseConfig'.")
 
-        def _recursive_parse(config, xml_context, elements, namespace):
+        def _recursive_parse(config, xml_context, elements, namespace, dependencies):
             for element in xml_context:
                 # ignore all other tags than those specified
-                if (element.tag != config.primary_tag) and (element.tag not in config.secondary_tags):
+                if (element.tag not in config.callbacks) and (element.tag not in config.secondary_tags):
                     continue
 
                 # check if we should use our own elements as args to evaluate the given expression
-                extra_args = elements if config.use_secondary_context else {}
+                context_args, extra_args = config.primary_context, elements if config.use_secondary_context else {}
+                if config.secondary_context_first:
+                    context_args, extra_args = extra_args, context_args
 
                 # useful variables
                 attrib = element.attrib
                 skip = False
                 
-                # evaluate any if/unless statements
-                if "if" in attrib.keys() and not self.substituter.evaluate_if(attrib["if"], config.primary_context, extra_args):
-                    logger.debug("Skipping '{}' because if='{}' evaluated to False.".format(element.tag, attrib["if"]))
-                    skip = True
-                if "unless" in attrib.keys() and not self.substituter.evaluate_unless(attrib["unless"], config.primary_context, extra_args):
-                    logger.debug("Skipping '{}' because unless='{}' evaluated to True.".format(element.tag, attrib["unless"]))
-                    skip = True
-
-                if skip:
-                    continue
-
-                # get namespace information:
-                sub_namespace = ""
-                if "ns" in attrib.keys():
-                    sub_namespace += self.substituter.evaluate(attrib["ns"], config.primary_context, extra_args) + "/"
-                new_namespace = (namespace + sub_namespace).replace("//", "/")
-
-                # if this is our desired end tag, evaluate it
-                if element.tag == config.primary_tag:
-                    config.callback(element, elements, new_namespace)
+                with self.substituter.recording_arguments() as read:
+                    # evaluate any if/unless statements
+                    if "if" in attrib.keys() and not self.substituter.evaluate_if(attrib["if"], context_args, extra_args):
+                        logger.debug("Skipping '{}' because if='{}' evaluated to False.".format(element.tag, attrib["if"]))
+                        skip = True
+                    if "unless" in attrib.keys() and not self.substituter.evaluate_unless(attrib["unless"], context_args, extra_args):
+                        logger.debug("Skipping '{}' because unless='{}' evaluated to True.".format(element.tag, attrib["unless"]))
+                        skip = True
+
+                    if skip:
+                        continue
+
+                    # get namespace information:
+                    sub_namespace = ""
+                    if "ns" in attrib.keys():
+                        sub_namespace += self.substituter.evaluate(attrib["ns"], context_args, extra_args) + "/"
+                    new_namespace = (namespace + sub_namespace).replace("//", "/")
+                new_dependencies = dependencies | read if read else dependencies
+
+                # if this is one of our desired end tags, evaluate it
+                if element.tag in config.callbacks:
+                    config.callbacks[element.tag](element, elements, new_namespace, new_dependencies)
                 elif element.tag in config.secondary_tags:                    
-                    _recursive_parse(config, element, elements, new_namespace)
+                    _recursive_parse(config, element, elements, new_namespace, new_dependencies)
 
-        _recursive_parse(config, xml_context, elements, config.namespace)
+        _recursive_parse(config, xml_context, elements, config.namespace, frozenset())
         return elements
 
-    def _get_xml_context(self):
+    def _get_xml_context(self, contents=None):
         # parse XML context
-        tree = ET.parse(self.fullpath)
-        xml_context = tree.getroot()
+        with profiler.span("read", "xml", file=self.fullpath):
+            xml_context = self.xml_cache.get(self.fullpath, contents)
 
         if not xml_context.tag == "launch":
             raise RuntimeError("Launch file {} doesn't start with a launch element; is it malformed?".format(self.fullpath))
@@ -239,62 +597,239 @@ Returns:
 def roslaunch_parse(filename, verbose=False):
     """ Take advantage of the roslaunch python package to parse the given file.
     """
+    # roslaunch is only needed (and slow to import) when full parameter information is requested
+    from roslaunch.config import ROSLaunchConfig
+    from roslaunch.xmlloader import XmlLoader
+
     logger.info("Parsing {}".format(filename))
     config = ROSLaunchConfig()
     loader = XmlLoader()
     loader.load(filename, config, verbose=verbose)
     return config
 
+""" Lookup table of the nodes parsed by roslaunch, keyed by their fully resolved names.
+
+Exact names are matched through a dictionary; anonymous nodes (whose resolved name only starts with the
+name we parsed) are matched through a sorted list of names, so each lookup is a hash or a binary search
+rather than a scan over all of roslaunch's nodes.
+"""
+class NodeIndex:
+    def __init__(self, config):
+        self.config = config
+        self.nodes = defaultdict(list)
+        self.order = {}
+        for idx, node in enumerate(config.nodes):
+            self.nodes[self.resolve_name(node)].append(node)
+            self.order[id(node)] = idx
+        self.names = sorted(self.nodes.keys())
+
+    @staticmethod
+    def resolve_name(node):
+        return node.namespace + node.name
+
+    """Return all nodes whose resolved name starts with the given prefix, in roslaunch's order.
+    """
+    def prefixed(self, prefix):
+        matches = []
+        for idx in range(bisect.bisect_left(self.names, prefix), len(self.names)):
+            if not self.names[idx].startswith(prefix):
+                break
+            matches.extend(self.nodes[self.names[idx]])
+        return sorted(matches, key=lambda node: self.order[id(node)])
+
+    """Pair the given resolved node name with the roslaunch node it corresponds to.
+    """
+    def match(self, node):
+        matches = self.nodes.get(node, [])
+        if len(matches) < 1:
+            # check if this is an anonymous node; this may not work properly
+            matches = self.prefixed(node)
+            if len(matches) == 0:
+                raise RuntimeError("Bad matching found for {}; canditates are: {}".format(node, self.config.resolved_node_names))
+            else:
+                logger.warning("Possible anonymous node '{}' can't be identified. ".format(node) \
+                    + "\nChose '{}' from '{}' arbitrarily. ".format(self.resolve_name(matches[0]), [self.resolve_name(m) for m in matches]) \
+                    + "The information about this node may be incorrect")
+        elif len(matches) > 1:
+            logger.error("Multiple nodes called '{}' detected; something is deeply wrong.".format(node))
+        return matches[0]
+
+""" Fully expand the subtree of the given launch file; this is the unit of work of parallel graph building.
+
+Args:
+    job:    Tuple of (fullpath, parent, input_arguments, namespace) of the subtree's root launch file.
+    seen:   Instance keys already expanded (identical instantiations are only expanded once).
+
+Returns:
+    A list of (fullpath, parent, input_arguments, namespace, record) tuples, one per launch file instance in
+    depth first order, where record is the evaluated contents of the file (see LaunchFile.to_record).
+"""
+def expand_subtree(job, seen=None):
+    seen = set() if seen is None else seen
+    fullpath, parent, input_arguments, namespace = job
+    launch_file = LaunchFile(fullpath, parent, input_arguments=input_arguments, namespace=namespace)
+    seen.add(launch_file.key)
+    subtree = [(fullpath, parent, input_arguments, namespace, launch_file.to_record())]
+
+    children = launch_file.get_children()
+    for child in launch_file.children:
+        if child not in seen:
+            subtree.extend(expand_subtree((children[child]["path"], launch_file.key, children[child]["args"], children[child]["namespace"]), seen))
+    return subtree
+
+def _initialize_worker(cache_dir):
+    # forked workers inherit the parent's initialized class variables (making this a no-op); spawned ones don't
+    LaunchFile.initialize(cache_dir)
+
 """ Parse the given launch file for all information necessary to build a network graph.
 
+Node information is taken from our own evaluation of each launch file (see LaunchNode) unless full
+parameter information is requested, in which case the whole tree is additionally loaded by roslaunch and
+its nodes are paired with ours.
+
+Args:
+    jobs:           Number of worker processes used to expand sibling subtrees in parallel (1 to expand serially).
+    full_params:    Whether to load the tree through roslaunch, which also resolves all params.
+    compact:        Whether to return a CompactGraph, releasing all XML trees and parser objects.
+
 Returns:
-    A dict of "LaunchFile" objects keyed against the full path of their files.
+    A dict of "LaunchFile" objects keyed against their instance keys (or its CompactGraph). Identical
+    instantiations of a launch file (same path, namespace and input arguments) are evaluated once and
+    shared, i.e. their key appears in the children of every file including it.
 """
-def build_graph(filename, input_arguments=None, verbose=False):
+def build_graph(filename, input_arguments=None, verbose=False, cache_dir=None, jobs=1, full_params=False, compact=False):
     """ Construct a graph of launch file nodes, starting with the top level file.
     """
-    # recursive function to build the network graph
-    def _process_parent(parent, config, graph):
+    # add a single (already evaluated) launch file to the network graph
+    def _add_to_graph(launch_file, index, graph):
         # create node in the graph
-        graph[parent.fullpath]["object"] = parent
-        graph[parent.fullpath]["children"] = parent.get_children()
-        nodes = parent.get_nodes()
+        graph[launch_file.key]["object"] = launch_file
+        graph[launch_file.key]["children"] = launch_file.get_children()
+        nodes = launch_file.get_nodes()
+        if index is None:
+            graph[launch_file.key]["nodes"].extend(launch_file.launch_nodes)
+            return
 
         # try to pair all nodes to those parsed from the roslaunch parser:
-        resolve_name = lambda node: node.namespace + node.name
         for node in nodes:
-            matches = [n for n in config.nodes if node==resolve_name(n)]
-            if len(matches) < 1:
-                # check if this is an anonymous node; this may not work properly
-                matches = [n for n in config.nodes if resolve_name(n).startswith(node)]
-                if len(matches) == 0:
-                    raise RuntimeError("Bad matching found for {}; canditates are: {}".format(node, config.resolved_node_names))
-                else:
-                    logger.warning("Possible anonymous node '{}' can't be identified. ".format(node) \
-                        + "\nChose '{}' from '{}' arbitrarily. ".format(resolve_name(matches[0]), [resolve_name(m) for m in matches]) \
-                        + "The information about this node may be incorrect")
-            elif len(matches) > 1:
-                logger.error("Multiple nodes called '{}' detected; something is deeply wrong.".format(node))
-            graph[parent.fullpath]["nodes"].append(matches[0])
-
-        for child in graph[parent.fullpath]["children"]:
+            graph[launch_file.key]["nodes"].append(index.match(node))
+
+    # recursive function to build the network graph
+    def _process_parent(parent, index, graph, pool):
+        _add_to_graph(parent, index, graph)
+        children = graph[parent.key]["children"]
+
+        # identical instantiations share the subtree we've already evaluated
+        new_children = [child for child in parent.children if child not in graph]
+
+        # sibling subtrees are independent, so farm them out to the pool (in order, for determinism)
+        if pool is not None and len(new_children) > 1:
+            subtree_jobs = [(children[child]["path"], parent.key, children[child]["args"], children[child]["namespace"]) for child in new_children]
+            for subtree in pool.map(expand_subtree, subtree_jobs):
+                for fullpath, parent_key, arguments, namespace, record in subtree:
+                    launch_file = LaunchFile(fullpath, parent_key, arguments, namespace, record=record)
+                    if launch_file.key not in graph:
+                        _add_to_graph(launch_file, index, graph)
+            return
+
+        for child in new_children:
+            # an earlier sibling's subtree may have included this same instance
+            if child in graph:
+                continue
             _process_parent(
-                LaunchFile(child, 
-                           parent.fullpath, 
-                           input_arguments=graph[parent.fullpath]["children"][child]["args"], 
-                           namespace=graph[parent.fullpath]["children"][child]["namespace"]),
-                config,
-                graph)
+                LaunchFile(children[child]["path"], 
+                           parent.key, 
+                           input_arguments=children[child]["args"], 
+                           namespace=children[child]["namespace"]),
+                index,
+                graph,
+                pool)
 
     # initial inputs to recursively build
     graph = defaultdict(lambda: {"object": [], "children": [], "nodes": []})
     input_arguments = {} if input_arguments is None else input_arguments
     # initialize class variables of LaunchFile (onetime thing)
-    LaunchFile.initialize()
+    LaunchFile.initialize(cache_dir)
 
-    # get roslaunch's version of the parsed XML:
-    config = roslaunch_parse(filename, verbose)
+    # get roslaunch's version of the parsed XML, if requested:
+    index = None
+    if full_params:
+        with profiler.span("roslaunch"):
+            index = NodeIndex(roslaunch_parse(filename, verbose))
 
     # process parent
-    _process_parent(LaunchFile(filename, input_arguments=input_arguments), config, graph)
+    pool = None
+    if jobs > 1:
+        import multiprocessing
+        pool = multiprocessing.Pool(jobs, _initialize_worker, (cache_dir,))
+    try:
+        _process_parent(LaunchFile(filename, input_arguments=input_arguments), index, graph, pool)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    if LaunchFile.cache is not None:
+        logger.info("Analysis cache: {} hits, {} misses.".format(LaunchFile.cache.hits, LaunchFile.cache.misses))
+
+    if compact:
+        for entry in graph.values():
+            entry["object"].release()
+        return CompactGraph.from_graph(graph)
     return graph
+
+""" Walk the launch tree depth first (in build_graph's order), yielding each launch file's record as soon as
+it's evaluated, followed by those of its nodes.
+
+Every file is dropped once its records are yielded, so apart from the keys of the files seen (shared
+instances are yielded once, as in build_graph) memory grows with the include depth rather than the size of
+the tree. Full params still load the whole tree through roslaunch up front.
+
+Returns:
+    A generator of record dictionaries (see file_record / node_record), with 'kind' set to 'file' or 'node'.
+"""
+def iter_graph(filename, input_arguments=None, verbose=False, cache_dir=None, full_params=False):
+    LaunchFile.initialize(cache_dir)
+    index = None
+    if full_params:
+        with profiler.span("roslaunch"):
+            index = NodeIndex(roslaunch_parse(filename, verbose))
+
+    seen = set()
+    # pending includes: (key, path, parent key, input arguments, namespace); the root is evaluated first
+    stack = [(None, filename, None, {} if input_arguments is None else input_arguments, "/")]
+    while stack:
+        key, fullpath, parent, arguments, namespace = stack.pop()
+        if key in seen:
+            continue
+        launch_file = LaunchFile(fullpath, parent, input_arguments=arguments, namespace=namespace)
+        seen.add(launch_file.key)
+
+        record = file_record(launch_file)
+        record["kind"] = "file"
+        yield record
+
+        nodes = launch_file.get_nodes()
+        for node in launch_file.launch_nodes if index is None else [index.match(node) for node in nodes]:
+            record = node_record(node, launch_file.key)
+            record["kind"] = "node"
+            yield record
+
+        children = launch_file.get_children()
+        stack.extend((child, children[child]["path"], launch_file.key, children[child]["args"], children[child]["namespace"])
+                     for child in reversed(launch_file.children) if child not in seen)
+        launch_file.release()
+
+""" Return the JSON serializable summary of a launch file (see batch.summarize).
+"""
+def file_record(launch_file):
+    return {"key": launch_file.key, "path": launch_file.fullpath, "parent": launch_file.parent,
+            "namespace": launch_file.namespace, "args": launch_file.args}
+
+""" Return the JSON serializable summary of a node launched by the launch file with the given key.
+"""
+def node_record(node, key):
+    attributes = dict(node.xmlattrs())
+    attributes["name"] = node.namespace + node.name
+    attributes["file"] = key
+    return attributes
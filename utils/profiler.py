@@ -0,0 +1,165 @@
+""" Optional instrumentation of an analysis, enabled by launchalyze.py's --profile flag.
+
+Code is instrumented through the module level span() context manager and, on hot paths, by checking
+whether a profiler is active before timing anything, e.g.:
+
+    with profiler.span("build_graph"):
+        ...
+
+When profiling is disabled (the default) span() returns a shared no-op context manager, so the cost of
+instrumentation is a global lookup and a comparison. Only the main process is profiled; launch files
+expanded by worker processes (--jobs) are not.
+
+Results are written as Chrome trace event JSON (viewable in chrome://tracing or https://ui.perfetto.dev)
+along with aggregate statistics, which can also be printed as a summary table.
+"""
+
+import os
+import json
+import logging
+import threading
+import timeit
+from collections import defaultdict
+
+logger = logging.getLogger(__name__)
+
+clock = timeit.default_timer
+
+# the active Profiler, if profiling is enabled
+active = None
+
+""" Records timed spans (as trace events) and aggregate statistics of named operations.
+"""
+class Profiler:
+    def __init__(self):
+        self.origin = clock()
+        self.pid = os.getpid()
+        self.events = []
+
+        # (category, name) -> [count, total seconds]
+        self.stats = defaultdict(lambda: [0, 0.0])
+
+        # named values, e.g. cache statistics, reported as they are
+        self.counters = {}
+
+    def span(self, name, category="phase", **args):
+        """ Return a context manager timing its body as a trace event, e.g. a launch file's evaluation.
+        """
+        return _Span(self, name, category, args)
+
+    def sample(self, category, name, start):
+        """ Add the time since start to the statistics of name, without recording a trace event.
+
+        Used for operations too numerous to trace individually, e.g. substitution args.
+        """
+        entry = self.stats[(category, name)]
+        entry[0] += 1
+        entry[1] += clock() - start
+
+    def add_event(self, name, category, start, end, args=None):
+        entry = self.stats[(category, name)]
+        entry[0] += 1
+        entry[1] += end - start
+
+        event = {
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": (start - self.origin) * 1e6,
+            "dur": (end - start) * 1e6,
+            "pid": self.pid,
+            "tid": threading.current_thread().ident}
+        if args:
+            event["args"] = args
+        self.events.append(event)
+
+    def to_trace(self):
+        """ Return the recorded events and statistics in Chrome's trace event format.
+        """
+        stats = defaultdict(dict)
+        for (category, name), (count, total) in self.stats.items():
+            stats[category][name] = {"count": count, "total": total}
+        return {
+            "traceEvents": self.events,
+            "displayTimeUnit": "ms",
+            "otherData": {"stats": stats, "counters": self.counters}}
+
+    def write(self, filename):
+        with open(filename, "w") as file_:
+            json.dump(self.to_trace(), file_, sort_keys=True, default=str)
+        logger.info("Wrote profile to {}".format(filename))
+
+    def summary(self, limit=10):
+        """ Return a table of phase totals, the slowest launch files, substitution args and counters.
+        """
+        lines = []
+        def table(title, category, limit=None):
+            rows = sorted(((total, count, name) for (cat, name), (count, total) in self.stats.items() if cat == category), reverse=True)
+            if not rows:
+                return
+            lines.append("{:<60} {:>8} {:>12} {:>12}".format(title, "count", "total (ms)", "mean (ms)"))
+            for total, count, name in rows[:limit]:
+                lines.append("{:<60} {:>8} {:>12.3f} {:>12.3f}".format(name[-60:], count, total * 1e3, total * 1e3 / count))
+            lines.append("")
+
+        table("phase", "phase")
+        table("launch file (slowest {})".format(limit), "launch_file", limit)
+        table("substitution arg", "substitution")
+        for category in sorted(set(cat for cat, _ in self.stats.keys()) - set(["phase", "launch_file", "substitution"])):
+            table(category, category)
+
+        if self.counters:
+            lines.append("{:<60} {:>8}".format("counter", "value"))
+            for name, value in sorted(self.counters.items()):
+                lines.append("{:<60} {:>8}".format(name, value))
+            lines.append("")
+        return "\n".join(lines)
+
+""" Start profiling, returning the new active Profiler.
+"""
+def enable():
+    global active
+    active = Profiler()
+    return active
+
+def disable():
+    global active
+    active = None
+
+""" Time the body of a with statement as a trace event of the active profiler, if there is one.
+"""
+def span(name, category="phase", **args):
+    if active is None:
+        return _NULL_SPAN
+    return active.span(name, category, **args)
+
+#------------------------------------- INTERNAL FUNCTIONS ------------------------------------#
+
+class _Span(object):
+    __slots__ = ("profiler", "name", "category", "args", "start")
+
+    def __init__(self, profiler, name, category, args):
+        self.profiler = profiler
+        self.name = name
+        self.category = category
+        self.args = args
+        self.start = None
+
+    def __enter__(self):
+        self.start = clock()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler.add_event(self.name, self.category, self.start, clock(), self.args)
+        return False
+
+class _NullSpan(object):
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+_NULL_SPAN = _NullSpan()
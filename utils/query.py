@@ -0,0 +1,111 @@
+""" Reverse indexes over an analyzed launch tree, answering questions like "which file launches this node"
+or "which args control whether it runs" without re-parsing.
+
+The indexes are built in a single pass over a graph (as returned by build_graph, or loaded from an export)
+using the argument dependencies recorded while evaluating it (see dependencies.py); every query is then a
+dictionary lookup.
+"""
+
+import logging
+from collections import defaultdict
+
+logger = logging.getLogger(__name__)
+
+class QueryIndex:
+    def __init__(self, graph):
+        self.graph = graph
+
+        # graph key -> keys of the files including it, from the root down to (and including) itself
+        self.chains = {}
+
+        # node name -> [(graph key, node)]
+        self.nodes = defaultdict(list)
+
+        # argument name -> [(graph key, included graph key)] / [(graph key, node name)] of the includes and
+        # nodes whose evaluation read it (in the context of the including / launching file)
+        self.arg_includes = defaultdict(list)
+        self.arg_nodes = defaultdict(list)
+
+        # package -> [(graph key, node name)]
+        self.packages = defaultdict(list)
+
+        # graph key of a file -> argument names the include of it (from its parent) depends on
+        self.include_dependencies = {}
+
+        # node name -> argument names it depends on
+        self.node_dependencies = {}
+
+        self._build()
+
+    def launched_by(self, name):
+        """ Return the chains of launch file keys (root first) launching the node with the given name.
+        """
+        return [self.chains[key] for key, _ in self.nodes.get(self._resolve(name), [])]
+
+    def controlled_by(self, name):
+        """ Return the (launch file key, argument names) pairs affecting whether (and how) the given node runs.
+
+        This covers the node's own attributes / conditions and the include of every file in its chain, each
+        in terms of the arguments of the file they're evaluated in.
+        """
+        name = self._resolve(name)
+        controls = []
+        for key, _ in self.nodes.get(name, []):
+            chain = self.chains[key]
+            for parent, child in zip(chain, chain[1:]):
+                dependencies = self.include_dependencies.get(child)
+                if dependencies:
+                    controls.append((parent, dependencies))
+            if self.node_dependencies.get(name):
+                controls.append((key, self.node_dependencies[name]))
+        return controls
+
+    def dependents(self, arg):
+        """ Return the includes and nodes depending on the given argument, as a dictionary of lists of
+        (launch file key, included file key / node name) pairs.
+        """
+        return {"includes": list(self.arg_includes.get(arg, [])), "nodes": list(self.arg_nodes.get(arg, []))}
+
+    def package_nodes(self, package):
+        """ Return the (launch file key, node name) pairs of all nodes of the given package.
+        """
+        return list(self.packages.get(package, []))
+
+    #------------------------------------- INTERNAL FUNCTIONS ------------------------------------#
+
+    def _resolve(self, name):
+        return name if name.startswith("/") else "/" + name
+
+    def _build(self):
+        roots = [key for key, value in self.graph.items() if value["object"].parent is None]
+        stack = [(root, [root]) for root in reversed(roots)]
+        while stack:
+            key, chain = stack.pop()
+            if key in self.chains:
+                continue
+            self.chains[key] = chain
+            entry = self.graph[key]
+            launch_file = entry["object"]
+
+            for node in entry["nodes"]:
+                name = node.namespace + node.name
+                self.nodes[name].append((key, node))
+                if node.package:
+                    self.packages[node.package].append((key, name))
+
+                # compact graphs carry dependencies on the nodes, built graphs on their launch files
+                dependencies = getattr(node, "dependencies", None)
+                if dependencies is None:
+                    dependencies = getattr(launch_file, "node_dependencies", {}).get(name, ())
+                self.node_dependencies[name] = list(dependencies)
+                for arg in dependencies:
+                    self.arg_nodes[arg].append((key, name))
+
+            for child in launch_file.children:
+                dependencies = list(entry["children"].get(child, {}).get("dependencies") or ())
+                self.include_dependencies.setdefault(child, dependencies)
+                for arg in dependencies:
+                    self.arg_includes[arg].append((key, child))
+            stack.extend((child, chain + [child]) for child in reversed(launch_file.children))
+
+        logger.debug("Indexed {} nodes of {} launch files.".format(len(self.nodes), len(self.chains)))
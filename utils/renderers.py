@@ -0,0 +1,232 @@
+""" Renderers of a Visualizer's graph data (see Visualizer.get_config) to files.
+
+    plotly: Interactive Sankey diagram, laid out in the browser by plotly.js (embedded in the page).
+    dot:    Graphviz DOT, streamed to the file as it's generated; lay it out with e.g. `dot -Tsvg`.
+    svg:    Static SVG with a layered layout computed here; hover text is shown as native tooltips.
+    html:   The SVG embedded in a minimal, self-contained HTML page.
+
+All but the plotly renderer write their output incrementally, in time and space linear in the number of
+nodes and links, and don't import plotly.
+"""
+
+import os
+import json
+import logging
+from xml.sax.saxutils import escape
+
+logger = logging.getLogger(__name__)
+
+""" Interface of renderers; render writes the given Visualizer's graph to filename.
+"""
+class Renderer:
+    DEFAULT_FILENAME = None
+
+    def render(self, visualizer, filename):
+        raise NotImplementedError
+
+class PlotlyRenderer(Renderer):
+    """ If any hover labels were truncated, their full text is written next to the plot as a script
+    (FILENAME.details.js), which the page loads when a link is first clicked. Unlike fetching JSON, this also
+    works when the page is opened from a file:// URL, as it is by default.
+    """
+    DEFAULT_FILENAME = "temp-plot.html"
+
+    def __init__(self, auto_open=True):
+        self.auto_open = auto_open
+
+    def render(self, visualizer, filename):
+        # plotly is slow to import, and only needed here
+        import plotly.offline
+        fig = dict(data=[visualizer.data], layout=visualizer.layout)
+        if not visualizer.details:
+            plotly.offline.plot(fig, validate=False, filename=filename, auto_open=self.auto_open)
+            return
+
+        details_file = filename + ".details.js"
+        with open(details_file, "w") as file_:
+            file_.write("window.launchalyzerDetails = {};\n".format(json.dumps(visualizer.details)))
+        plotly.offline.plot(fig, validate=False, filename=filename, auto_open=self.auto_open,
+            post_script=DETAILS_SCRIPT.format(details=os.path.basename(details_file)))
+
+class DotRenderer(Renderer):
+    DEFAULT_FILENAME = "launchalyzer.dot"
+
+    def render(self, visualizer, filename):
+        data = visualizer.data
+        labels = data["node"]["label"]
+        colors = data["node"]["color"]
+        link = data["link"]
+        with open(filename, "w") as file_:
+            file_.write("digraph launchalyzer {\n")
+            file_.write("  graph [rankdir=LR, label={}];\n".format(_dot_string(visualizer.layout["title"])))
+            file_.write("  node [shape=box, style=filled, fontcolor=white];\n")
+            for idx in range(len(labels)):
+                file_.write("  n{} [label={}, fillcolor={}];\n".format(idx, _dot_string(labels[idx]), _dot_string(colors[idx])))
+            for idx in range(len(link["source"])):
+                file_.write("  n{} -> n{} [label={}, tooltip={}];\n".format(
+                    int(link["source"][idx]), int(link["target"][idx]), int(link["value"][idx]), _dot_string(_plain(_link_label(visualizer, idx)))))
+            file_.write("}\n")
+        logger.info("Wrote {} nodes and {} links to {}".format(len(labels), len(link["source"]), filename))
+
+class SvgRenderer(Renderer):
+    """ Nodes are placed in columns by their longest distance from a root, and ordered within a column in
+    breadth first order from the roots, which keeps each launch file's nodes together.
+    """
+    DEFAULT_FILENAME = "launchalyzer.svg"
+
+    # layout dimensions, in pixels
+    COLUMN_WIDTH = 320
+    NODE_WIDTH = 12
+    ROW_HEIGHT = 22
+    MARGIN = 40
+    MAX_STROKE = 12
+
+    def render(self, visualizer, filename):
+        with open(filename, "w") as file_:
+            self.write_svg(visualizer, file_)
+
+    def write_svg(self, visualizer, file_):
+        data = visualizer.data
+        labels = data["node"]["label"]
+        colors = data["node"]["color"]
+        link = data["link"]
+        sources = [int(source) for source in link["source"]]
+        targets = [int(target) for target in link["target"]]
+        values = [int(value) for value in link["value"]]
+
+        columns, rows, height = self.layout(len(labels), sources, targets)
+        width = (max(columns) + 1 if columns else 1) * self.COLUMN_WIDTH + 2 * self.MARGIN
+        position = lambda idx: (self.MARGIN + columns[idx] * self.COLUMN_WIDTH, self.MARGIN + rows[idx] * self.ROW_HEIGHT)
+        # links of files without nodes (in their subtree) have a value of 0
+        scale = float(self.MAX_STROKE - 1) / (max(values) or 1) if values else 0
+
+        file_.write('<svg xmlns="http://www.w3.org/2000/svg" width="{}" height="{}" font-family="sans-serif" font-size="12">\n'.format(
+            width, height * self.ROW_HEIGHT + 2 * self.MARGIN))
+        file_.write('<text x="{}" y="{}" font-size="16">{}</text>\n'.format(self.MARGIN, self.MARGIN // 2, escape(visualizer.layout["title"])))
+
+        # links first, so nodes are drawn over them
+        file_.write('<g fill="none" stroke="#888" stroke-opacity="0.4">\n')
+        for idx in range(len(sources)):
+            x1, y1 = position(sources[idx])
+            x2, y2 = position(targets[idx])
+            x1 += self.NODE_WIDTH
+            middle = (x1 + x2) / 2.0
+            file_.write('<path d="M{},{} C{},{} {},{} {},{}" stroke-width="{:.1f}"><title>{}</title></path>\n'.format(
+                x1, y1, middle, y1, middle, y2, x2, y2, 1 + values[idx] * scale, escape(_plain(_link_label(visualizer, idx)))))
+        file_.write('</g>\n')
+
+        file_.write('<g>\n')
+        for idx in range(len(labels)):
+            x, y = position(idx)
+            file_.write('<g><title>{}</title><rect x="{}" y="{}" width="{}" height="{}" fill="{}"/><text x="{}" y="{}">{}</text></g>\n'.format(
+                escape(labels[idx]), x, y - self.ROW_HEIGHT // 3, self.NODE_WIDTH, 2 * self.ROW_HEIGHT // 3, escape(colors[idx]),
+                x + self.NODE_WIDTH + 4, y + 4, escape(labels[idx])))
+        file_.write('</g>\n')
+        file_.write('</svg>\n')
+        logger.info("Rendered {} nodes and {} links in {} columns".format(len(labels), len(sources), max(columns) + 1 if columns else 0))
+
+    @staticmethod
+    def layout(count, sources, targets):
+        """ Return the column and row of every node, and the number of rows, in time linear in the graph.
+        """
+        children = [[] for _ in range(count)]
+        parents = [0] * count
+        for source, target in zip(sources, targets):
+            children[source].append(target)
+            parents[target] += 1
+
+        # columns: longest path from a root (Kahn's algorithm); order: parents' order, roots first
+        columns = [0] * count
+        order = [idx for idx in range(count) if parents[idx] == 0]
+        placed = [False] * count
+        remaining = list(parents)
+        head = 0
+        while head < len(order):
+            current = order[head]
+            head += 1
+            placed[current] = True
+            for child in children[current]:
+                columns[child] = max(columns[child], columns[current] + 1)
+                remaining[child] -= 1
+                if remaining[child] == 0:
+                    order.append(child)
+        # anything left is on a cycle, which launch trees shouldn't have; put it in the first column
+        for idx in range(count):
+            if not placed[idx]:
+                columns[idx] = 0
+                order.append(idx)
+
+        rows = [0] * count
+        next_row = {}
+        for idx in order:
+            rows[idx] = next_row.get(columns[idx], 0)
+            next_row[columns[idx]] = rows[idx] + 1
+        return columns, rows, max(next_row.values()) if next_row else 0
+
+class HtmlRenderer(SvgRenderer):
+    DEFAULT_FILENAME = "launchalyzer.html"
+
+    def render(self, visualizer, filename):
+        with open(filename, "w") as file_:
+            file_.write('<!DOCTYPE html>\n<html><head><meta charset="utf-8"><title>{}</title></head>\n<body>\n'.format(
+                escape(visualizer.layout["title"])))
+            self.write_svg(visualizer, file_)
+            file_.write('</body></html>\n')
+
+RENDERERS = {"plotly": PlotlyRenderer, "dot": DotRenderer, "svg": SvgRenderer, "html": HtmlRenderer}
+
+""" Return an instance of the renderer with the given name (see RENDERERS).
+"""
+def get_renderer(name, auto_open=True):
+    if name not in RENDERERS:
+        raise RuntimeError("Unknown renderer '{}'; expected one of {}.".format(name, ", ".join(sorted(RENDERERS.keys()))))
+    if name == "plotly":
+        return PlotlyRenderer(auto_open)
+    return RENDERERS[name]()
+
+#------------------------------------- INTERNAL FUNCTIONS ------------------------------------#
+
+def _link_label(visualizer, idx):
+    # the full text of the link's hover label, even if it was truncated for plotly
+    details = visualizer.data["link"].get("customdata")
+    if details is not None and details[idx] >= 0:
+        return visualizer.details[details[idx]]
+    return visualizer.data["link"]["label"][idx]
+
+def _plain(label):
+    # hover labels are formatted for plotly; strip the markup for tooltips
+    return label.replace("<br>", "\n").replace("<b>", "").replace("</b>", "").replace("<i>", "").replace("</i>", "")
+
+def _dot_string(string):
+    return '"{}"'.format(string.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+
+# loads the full text of truncated hover labels when a link is clicked
+DETAILS_SCRIPT = """
+var plot = document.getElementById('{{plot_id}}');
+var details = null;
+var pending = [];
+plot.on('plotly_click', function(event) {{
+    var index = event.points[0].customdata;
+    if (index === undefined || index < 0) {{ return; }}
+    var show = function() {{
+        var element = document.getElementById('launchalyzer-details');
+        if (!element) {{
+            element = document.createElement('div');
+            element.id = 'launchalyzer-details';
+            document.body.appendChild(element);
+        }}
+        element.innerHTML = details[index];
+    }};
+    if (details !== null) {{ show(); return; }}
+    pending.push(show);
+    if (pending.length > 1) {{ return; }}
+    // a script (unlike fetch) may be loaded from a file:// page; it sets window.launchalyzerDetails
+    var script = document.createElement('script');
+    script.src = '{details}';
+    script.onload = function() {{
+        details = window.launchalyzerDetails;
+        pending.splice(0).pop()();
+    }};
+    document.head.appendChild(script);
+}});
+"""
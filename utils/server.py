@@ -0,0 +1,289 @@
+""" Long running analysis server, answering JSON-RPC 2.0 requests over localhost HTTP.
+
+Everything that makes a one-off run of launchalyze.py slow is kept warm between requests: imports, the
+substituter (and its package index), parsed XML and a DependencyMemo of evaluated launch files. Results
+are cached per (launch file, arguments, full params) and returned as long as none of the tree's files
+changed; when some did, only those files (and whatever they affect) are re-evaluated, as in watch mode.
+
+Requests are POSTed to / and handled by a fixed pool of worker threads, e.g.:
+
+    {"jsonrpc": "2.0", "id": 1, "method": "build_graph", "params": {"launch_file": "/ws/robot.launch", "args": {"sim": "true"}}}
+
+Methods:
+    build_graph:    {launch_file, args, full_params} -> the launched files and nodes (see batch.summarize)
+    query:          {launch_file, args, full_params, node | arg | package} -> see query.QueryIndex
+    stats:          {} -> cache statistics
+
+Builds share the LaunchFile class state, so they're serialized; cached results are answered concurrently.
+Analyses are kept as CompactGraphs, so many configurations can be cached in one process.
+"""
+
+import json
+import logging
+import threading
+from collections import OrderedDict
+try:
+    import Queue
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+except ImportError:
+    import queue as Queue
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+
+import parser
+from batch import summarize
+from query import QueryIndex
+from watch import signature
+from dependencies import DependencyMemo
+
+logger = logging.getLogger(__name__)
+
+# JSON-RPC 2.0 error codes
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+
+# JSON strings decode to unicode under python 2
+STRING_TYPES = (str, type(u""))
+ANALYSIS_ERROR = -32000
+
+class RpcError(Exception):
+    def __init__(self, code, message):
+        Exception.__init__(self, message)
+        self.code = code
+        self.message = message
+
+""" A cached analysis: its CompactGraph (without any XML or parser state), the signatures of its files, and
+its summary and query index, built on first use.
+"""
+class Analysis:
+    def __init__(self, compact, signatures):
+        self.compact = compact
+        self.signatures = signatures
+        self.summary = None
+        self.graph = None
+        self.index = None
+        self.lock = threading.Lock()
+
+    def is_valid(self):
+        return all(signature(path) == previous for path, previous in self.signatures.items())
+
+    def get_summary(self):
+        with self.lock:
+            if self.summary is None:
+                self.summary = summarize(self.compact.to_graph())
+        return self.summary
+
+    def get_index(self):
+        """ Return the query index, and the graph view (see CompactGraph.to_graph) its keys refer to.
+        """
+        with self.lock:
+            if self.index is None:
+                self.graph = self.compact.to_graph()
+                self.index = QueryIndex(self.graph)
+        return self.index, self.graph
+
+""" The methods served, with the warm state they share.
+
+Args:
+    max_analyses:       Number of (launch file, arguments) results kept; the least recently used are dropped.
+    max_evaluations:    Number of evaluated launch files kept in the shared DependencyMemo, likewise.
+"""
+class AnalysisService:
+    def __init__(self, cache_dir=None, max_analyses=32, max_evaluations=4096):
+        self.cache_dir = cache_dir
+        self.max_analyses = max_analyses
+        self.analyses = OrderedDict()
+
+        # signatures of every file in the memo, as of when it was evaluated
+        self.files = {}
+        self.lock = threading.Lock()
+        self.build_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        parser.LaunchFile.initialize(cache_dir)
+        parser.LaunchFile.memo = DependencyMemo(max_evaluations)
+        self.methods = {"build_graph": self.build_graph, "query": self.query, "stats": self.stats}
+
+    def handle(self, request):
+        """ Answer a decoded JSON-RPC request, returning the response (or None for notifications).
+        """
+        if not isinstance(request, dict) or request.get("jsonrpc") != "2.0" or "method" not in request:
+            return _error(None, INVALID_REQUEST, "Invalid JSON-RPC 2.0 request.")
+        params = request.get("params", {})
+        try:
+            method = self.methods.get(request["method"])
+            if method is None:
+                raise RpcError(METHOD_NOT_FOUND, "Unknown method '{}'.".format(request["method"]))
+            if not isinstance(params, dict):
+                raise RpcError(INVALID_PARAMS, "Parameters must be an object.")
+            result = method(**params)
+        except RpcError as error:
+            return _error(request.get("id"), error.code, error.message)
+        except TypeError as error:
+            return _error(request.get("id"), INVALID_PARAMS, str(error))
+        except parser.BUILD_ERRORS as error:
+            return _error(request.get("id"), ANALYSIS_ERROR, str(error))
+        except Exception as error:
+            logger.exception("Failed to answer {}".format(request["method"]))
+            return _error(request.get("id"), INTERNAL_ERROR, "Internal error: {}".format(error))
+        if "id" not in request:
+            return None
+        return {"jsonrpc": "2.0", "id": request["id"], "result": result}
+
+    def build_graph(self, launch_file, args=None, full_params=False):
+        return self.analysis(launch_file, args, full_params).get_summary()
+
+    def query(self, launch_file, args=None, full_params=False, node=None, arg=None, package=None):
+        if [node, arg, package].count(None) != 2:
+            raise RpcError(INVALID_PARAMS, "Exactly one of node, arg or package is required.")
+        if not isinstance(node or arg or package, STRING_TYPES):
+            raise RpcError(INVALID_PARAMS, "The node, arg or package must be a string.")
+
+        index, graph = self.analysis(launch_file, args, full_params).get_index()
+        describe = lambda key: {"path": graph[key]["object"].fullpath, "namespace": graph[key]["object"].namespace}
+
+        if node is not None:
+            return {
+                "launched_by": [[describe(key) for key in chain] for chain in index.launched_by(node)],
+                "controlled_by": [{"file": describe(key), "args": names} for key, names in index.controlled_by(node)]}
+        if arg is not None:
+            dependents = index.dependents(arg)
+            return {
+                "includes": [{"file": describe(key), "include": describe(child)} for key, child in dependents["includes"]],
+                "nodes": [{"file": describe(key), "node": name} for key, name in dependents["nodes"]]}
+        return [{"file": describe(key), "node": name} for key, name in index.package_nodes(package)]
+
+    def stats(self):
+        info = dict(("cache." + name, value) for name, value in parser.LaunchFile.cache_info().items())
+        with self.lock:
+            info.update({"analyses": len(self.analyses), "analyses.hits": self.hits, "analyses.misses": self.misses})
+        return info
+
+    def analysis(self, launch_file, args=None, full_params=False):
+        """ Return the (cached, if still valid) analysis of the given launch file and arguments.
+        """
+        if not isinstance(launch_file, STRING_TYPES):
+            raise RpcError(INVALID_PARAMS, "launch_file must be a string.")
+        args = _arguments(args)
+        key = (launch_file, json.dumps(args, sort_keys=True), bool(full_params))
+        with self.lock:
+            analysis = self.analyses.pop(key, None)
+            if analysis is not None:
+                self.analyses[key] = analysis
+        if analysis is not None and analysis.is_valid():
+            with self.lock:
+                self.hits += 1
+            return analysis
+
+        with self.build_lock:
+            # concurrent requests for the same analysis wait for the first one's build
+            with self.lock:
+                built = self.analyses.get(key)
+            if built is not None and built is not analysis and built.is_valid():
+                with self.lock:
+                    self.hits += 1
+                return built
+
+            # the memo is shared by all analyses, so drop the evaluations of any file changed since it was read
+            for path, previous in list(self.files.items()):
+                if signature(path) != previous:
+                    parser.LaunchFile.memo.discard(path)
+                    del self.files[path]
+
+            logger.info("Analyzing {} with arguments {}".format(launch_file, args))
+            try:
+                # only the compact form is kept, so cached analyses don't hold on to XML trees or parser objects
+                compact = parser.build_graph(launch_file, args, False, self.cache_dir, 1, full_params, compact=True)
+            finally:
+                # only the files still in the memo need watching
+                self.files = dict((path, self.files[path] if path in self.files else signature(path))
+                                  for path, _ in parser.LaunchFile.memo.entries.keys())
+            paths = set(compact.file_path(file_id) for file_id in range(compact.file_count()))
+            analysis = Analysis(compact, dict((path, self.files.get(path) or signature(path)) for path in paths))
+
+            with self.lock:
+                self.misses += 1
+                self.analyses.pop(key, None)
+                self.analyses[key] = analysis
+                while len(self.analyses) > self.max_analyses:
+                    self.analyses.popitem(last=False)
+        return analysis
+
+""" HTTP server handing its requests to a fixed pool of worker threads.
+"""
+class AnalysisServer(HTTPServer):
+    def __init__(self, address, service, workers=4):
+        HTTPServer.__init__(self, address, _RequestHandler)
+        self.service = service
+        self.requests = Queue.Queue()
+        for _ in range(workers):
+            thread = threading.Thread(target=self._worker, name="analysis-worker")
+            thread.daemon = True
+            thread.start()
+
+    def process_request(self, request, client_address):
+        self.requests.put((request, client_address))
+
+    def _worker(self):
+        while True:
+            request, client_address = self.requests.get()
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+""" Serve analyses on the given address until interrupted.
+"""
+def serve(host="127.0.0.1", port=8765, workers=4, cache_dir=None):
+    server = AnalysisServer((host, port), AnalysisService(cache_dir), workers)
+    logger.info("Serving analyses on http://{}:{}/ with {} workers".format(host, server.server_address[1], workers))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+#------------------------------------- INTERNAL FUNCTIONS ------------------------------------#
+
+def _arguments(args):
+    # launch file arguments as native strings, like those from the command line
+    if args is None:
+        return {}
+    if not isinstance(args, dict) or not all(isinstance(value, STRING_TYPES) for value in args.values()):
+        raise RpcError(INVALID_PARAMS, "Arguments must be an object of strings.")
+    try:
+        return dict((str(name), str(value)) for name, value in args.items())
+    except UnicodeError:
+        raise RpcError(INVALID_PARAMS, "Argument names and values must be ASCII.")
+
+def _error(request_id, code, message):
+    return {"jsonrpc": "2.0", "id": request_id, "error": {"code": code, "message": message}}
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))).decode("utf-8"))
+        except ValueError:
+            response = _error(None, PARSE_ERROR, "Request isn't valid JSON.")
+        else:
+            # batches are answered in order, without the responses to notifications
+            if isinstance(request, list):
+                response = [answer for answer in map(self.server.service.handle, request) if answer is not None]
+            else:
+                response = self.server.service.handle(request)
+
+        body = b"" if response is None else json.dumps(response, sort_keys=True, default=str).encode("utf-8")
+        self.send_response(200 if body else 204)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug("{} {}".format(self.address_string(), format % args))
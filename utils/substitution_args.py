@@ -1,8 +1,10 @@
 import os
-import re
-import copy
 import logging
-import rospkg
+import contextlib
+
+import profiler
+from package_index import PackageIndex
+from expression import ExpressionCompiler
 
 logger = logging.getLogger(__name__)
 
@@ -11,21 +13,44 @@ class SubstitutionArgs:
 
     http://wiki.ros.org/roslaunch/XML
     """
-    def __init__(self):
-        self.rospack = rospkg.RosPack()
+    # substitution arg types we know how to evaluate, e.g. $(env VAR)
+    KINDS = ("env", "optenv", "find", "anon", "arg", "eval", "dirname")
+
+    # names with a fixed meaning in expressions; roslaunch isn't strict about the capitalization of booleans
+    LITERALS = {"true": True, "True": True, "false": False, "False": False}
+
+    # functions callable from expressions (in addition to those provided by roslaunch's $(eval))
+    BUILTINS = {
+        "str": str, "int": int, "float": float, "bool": bool, "len": len, "min": min, "max": max, "abs": abs,
+        "round": round, "sorted": sorted, "list": list, "tuple": tuple}
+
+    def __init__(self, package_index_file=None):
+        # package lookup for $(find); built (or loaded from package_index_file) on first use
+        self.package_index_file = package_index_file
+        self.package_index = None
+
+        # compiled templates, keyed by their source text
+        self.templates = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+        # when set to a dict, records the value (or None) of every environment variable read
+        self.environment = None
+
+        # when set to a dict, records the directory of every package found through $(find)
+        self.packages = None
+
+        # when set to a set, records the name of every argument read (see recording_arguments)
+        self.arguments_read = None
+
+        # compiled $(eval) expressions and if/unless conditions
+        self.expressions = ExpressionCompiler(["arg", "env", "optenv", "find", "anon"] + list(self.BUILTINS.keys()))
 
     def evaluate_if(self, statement, context_args, local_args):
         """Evaluate an 'if' statement:
         """
         evaluated_statement = self.evaluate(statement, context_args, local_args)
-
-        # somewhat hacky solution to the fact that roslaunch isn't strict about interpreting capitalization of "false" vs. "False"
-        if "false" in evaluated_statement:
-            evaluated_statement = evaluated_statement.replace("false", "False")
-        if "true" in evaluated_statement:
-            evaluated_statement = evaluated_statement.replace("true", "True")
-
-        return eval(evaluated_statement)
+        return bool(self.expressions.evaluate(evaluated_statement, self._lookup_literal))
 
     def evaluate_unless(self, statement, context_args, local_args):
         """Evaluate an 'unless' statement:
@@ -33,139 +58,225 @@ class SubstitutionArgs:
         return not self.evaluate_if(statement, context_args, local_args)
 
     @staticmethod
-    def get_substrings(input_string):
-        """ get substitution arg substrings : $(***)
-        """
-        string = copy.copy(input_string)
-        substrings = []
+    def tokenize(input_string):
+        """ split a string into literal text and substitution arg substrings : $(***)
 
-        start_idx = string.find("$(")
+        Returns a list of (substring, is_substitution) tuples in order of appearance.
+        """
+        tokens = []
+        position = 0
+        start_idx = input_string.find("$(")
         while start_idx >= 0:
+            if start_idx > position:
+                tokens.append((input_string[position:start_idx], False))
+
             count = 1
-            for idx in range(start_idx+2, len(string)):
-                char = string[idx]
+            for idx in range(start_idx+2, len(input_string)):
+                char = input_string[idx]
                 if char == "(":
                     count += 1
                 elif char == ")":
                     count -= 1
                 if count == 0:
                     # we've closed our bracket
-                    substring = string[start_idx:idx+1]
-                    string = string.replace(substring, "")
-                    substrings.append(substring)
                     break
-                if idx == len(string)-1:
-                    # if we've got this far the string is unmatched
-                    raise RuntimeError("Failed to find matching bracket for '$(' in string {}; is it malformed?".format(input_string))
+            if count != 0:
+                # if we've got this far the string is unmatched
+                raise RuntimeError("Failed to find matching bracket for '$(' in string {}; is it malformed?".format(input_string))
+
+            tokens.append((input_string[start_idx:idx+1], True))
+            position = idx + 1
+            start_idx = input_string.find("$(", position)
+
+        if position < len(input_string):
+            tokens.append((input_string[position:], False))
+        return tokens
+
+    @staticmethod
+    def get_substrings(input_string):
+        """ get substitution arg substrings : $(***)
+        """
+        return [token for token, substitution in SubstitutionArgs.tokenize(input_string) if substitution]
+
+    def compile(self, string):
+        """ Compile a string into a template of literal parts and typed substitution slots.
 
-            start_idx = string.find("$(")
-        return substrings
+        A template is a tuple of (kind, text) parts, where kind is None for literal text and otherwise one
+        of KINDS, with text being the substitution arg's parameters. Templates are cached by source string.
+        """
+        template = self.templates.get(string)
+        if template is not None:
+            self.cache_hits += 1
+            return template
+        self.cache_misses += 1
+
+        parts = []
+        for token, substitution in self.tokenize(string):
+            if not substitution:
+                parts.append((None, token))
+                continue
+            kind, _, text = token[2:-1].partition(" ")
+            if kind not in self.KINDS:
+                raise RuntimeError("Unable to evaluate substitution arg call for string {}".format(token))
+            parts.append((kind, text))
+
+        template = tuple(parts)
+        self.templates[string] = template
+        return template
+
+    @contextlib.contextmanager
+    def recording_arguments(self):
+        """ Record the names of all arguments read by evaluations within this context.
+
+        Yields the set of names, which is also merged into any enclosing recording on exit.
+        """
+        read = set()
+        outer = self.arguments_read
+        self.arguments_read = read
+        try:
+            yield read
+        finally:
+            self.arguments_read = outer
+            if outer is not None:
+                outer.update(read)
+
+    def cache_info(self):
+        """ Return statistics about the compiled template cache.
+        """
+        return {"hits": self.cache_hits, "misses": self.cache_misses, "size": len(self.templates)}
 
     def evaluate(self, string, context_args=None, local_context=None):
         """ Evaluate a given string in the context of the launch file 
         """
-        original = string
-        substrings = self.get_substrings(string)
-            
-        for substring in substrings:
-            if substring.find("$(env ") == 0:
-                evaluated_string = self._eval_env(substring)
-            elif substring.find("$(optenv ") == 0:
-                evaluated_string = self._eval_optenv(substring)
-            elif substring.find("$(find ") == 0:
-                evaluated_string = self._eval_find(substring)
-            elif substring.find("$(anon ") == 0:
-                evaluated_string = self._eval_anon(substring)
-            elif substring.find("$(arg ") == 0:
-                evaluated_string = self._eval_arg(substring, context_args, local_context)
-            elif substring.find("$(eval ") == 0:
-                evaluated_string = self._eval_eval(substring, context_args, local_context)
-            elif substring.find("$(dirname ") == 0:
-                evaluated_string = self._eval_dirname(substring)
-            else:
-                raise RuntimeError("Unable to evaluate substitution arg call for string {}".format(substring))
-
-            string = string.replace(substring, evaluated_string)
-
-        logger.debug("\tEvaluated '{}' as '{}'".format(original, string))
-        return string
-
-    def _eval_env(self, substring):
-        var = substring[6:-1]
+        template = self.compile(string)
+
+        # substitution args are too numerous to trace individually, so only their statistics are profiled
+        profile = profiler.active
+        evaluated = []
+        for kind, text in template:
+            if kind is None:
+                evaluated.append(text)
+                continue
+
+            start = profiler.clock() if profile is not None else None
+            if kind == "env":
+                evaluated.append(self._eval_env(text))
+            elif kind == "optenv":
+                evaluated.append(self._eval_optenv(text))
+            elif kind == "find":
+                evaluated.append(self._eval_find(text))
+            elif kind == "anon":
+                evaluated.append(self._eval_anon(text))
+            elif kind == "arg":
+                evaluated.append(self._eval_arg(text, context_args, local_context))
+            elif kind == "eval":
+                evaluated.append(self._eval_eval(text, context_args, local_context))
+            elif kind == "dirname":
+                evaluated.append(self._eval_dirname(text))
+            if profile is not None:
+                profile.sample("substitution", kind, start)
+
+        result = "".join(evaluated)
+        logger.debug("\tEvaluated '{}' as '{}'".format(string, result))
+        return result
+
+    def _record_environment(self, var):
+        if self.environment is not None:
+            self.environment[var] = os.environ.get(var)
+
+    def _eval_env(self, var):
+        self._record_environment(var)
         if var not in os.environ.keys():
             raise RuntimeError("Environmental variable '{}' not found.".format(var))
         return os.environ[var]
         
-    def _eval_optenv(self, substring):
-        optvar = substring[9:-1].split(" ")
+    def _eval_optenv(self, text):
+        optvar = text.split(" ")
+        self._record_environment(optvar[0])
         if optvar[0] in os.environ.keys():
             return os.environ[optvar[0]]
         else:
             if len(optvar) == 1:
-                logger.warning("No default for optenv in '{}'.".format(substring))
+                logger.warning("No default for optenv in '$(optenv {})'.".format(text))
                 return ""
             return optvar[1]
 
-    def _eval_find(self, substring):
-        package = substring[7:-1]
+    def get_package_index(self):
+        """ Return our package index, loading or building it if necessary.
+        """
+        if self.package_index is None:
+            with profiler.span("package_index"):
+                if self.package_index_file:
+                    self.package_index = PackageIndex.load(self.package_index_file)
+                else:
+                    self.package_index = PackageIndex()
+                    self.package_index.crawl()
+        return self.package_index
+
+    def find_package(self, package):
+        """ Return the directory of the given package, or None if it can't be found.
+        """
+        return self.get_package_index().packages.get(package)
+
+    def _eval_find(self, package):
         try:
-            path = self.rospack.get_path(package)
-        except rospkg.common.ResourceNotFound:
+            path = self.get_package_index().get_path(package)
+        except KeyError:
             raise RuntimeError("Failed to find package '{}', did you source your workspace?".format(package))
+        if self.packages is not None:
+            self.packages[package] = path
         return path
 
-    def _eval_anon(self, substring):
+    def _eval_anon(self, name):
         logger.warning("Tag 'anon' not fully supported; node matching may be incorrect.")
-        return substring[7:-1]
+        return name
 
-    def _eval_arg(self, substring, context_args, local_context):
-        arg = substring[6:-1]
+    def _record_argument(self, arg):
+        if self.arguments_read is not None:
+            self.arguments_read.add(arg)
 
-        if arg not in context_args.keys():
-            if arg in local_context.keys():
+    def _eval_arg(self, arg, context_args, local_context):
+        self._record_argument(arg)
+        if arg not in context_args:
+            if arg in local_context:
                 return local_context[arg]
             raise RuntimeError("Unable to substitute argument '{}'; not found in context.".format(arg))
         return context_args[arg]
 
-    def _eval_eval(self, substring, context_args, local_context):
-        eval_statement = substring[7:-1]
+    def _eval_eval(self, eval_statement, context_args, local_context):
+        # arguments are bound by name (implicitly, or through the arg() function) when the expression is evaluated
+        def get_argument(name):
+            self._record_argument(name)
+            if name in context_args:
+                return context_args[name]
+            if name in local_context:
+                return local_context[name]
+            raise RuntimeError("Unable to substitute argument '{}'; not found in context.".format(name))
 
-        # substitute any arguments:
-        for arg_statement in re.findall(r'arg\([^()]*\)', eval_statement):
-            arg_to_replace = arg_statement[4:-1].replace("'", "")
-            if arg_to_replace not in context_args.keys():
-                if arg_to_replace not in local_context.keys():
-                    raise RuntimeError("Unable to substitute argument '{}'; not found in context.".format(arg_to_replace))
-                else:
-                    value = local_context[arg_to_replace]
-            else:
-                value = context_args[arg_to_replace]
-            eval_statement = eval_statement.replace(arg_statement, "'" + value + "'")
-
-        # substitute any arguments not specified by the arg tag (blah)
-        for possible_argument in re.split(r'\W+', eval_statement):
-            if possible_argument in context_args.keys():
-                logger.info("Implicitly substituting {} for {}".format(possible_argument, context_args[possible_argument]))
-                eval_statement = eval_statement.replace(possible_argument, "'" + context_args[possible_argument] + "'")
-            elif possible_argument in local_context.keys():
-                logger.info("Implicitly substituting {} for {}".format(possible_argument, local_context[possible_argument]))
-                eval_statement = eval_statement.replace(possible_argument, "'" + local_context[possible_argument] + "'")
-
-        # run python eval as statement (theoretically we should not have any more variables, so blanket replacing true/True is ok.)
-
-        return self._replace_TrueFalse(str(eval(self._replace_truefalse(eval_statement))))
-
-    def _replace_truefalse(self, string):
-        # replace instances of 'true' with pythonic 'True' (and 'false'/'true')
-        string = string.replace("true", "True")
-        string = string.replace("false", "False")
-        return string
-
-    def _replace_TrueFalse(self, string):
-        # replace instances of 'True' with roslaunchic 'true' (and 'False'/'True')        
-        string = string.replace("True", "true")
-        string = string.replace("False", "false")
-        return string
-
-    def _eval_dirname(self, substring):
+        functions = {
+            "arg": get_argument,
+            "env": self._eval_env,
+            "optenv": lambda var, default="": self._eval_optenv(var + " " + default if default else var),
+            "find": self._eval_find,
+            "anon": self._eval_anon}
+
+        def lookup(name):
+            if name in self.LITERALS:
+                return self.LITERALS[name]
+            if name in context_args or name in local_context:
+                return get_argument(name)
+            if name in functions:
+                return functions[name]
+            return self.BUILTINS[name]
+
+        result = self.expressions.evaluate(eval_statement, lookup)
+        # booleans are spelled the roslaunch way
+        if isinstance(result, bool):
+            return "true" if result else "false"
+        return str(result)
+
+    def _lookup_literal(self, name):
+        return self.LITERALS[name]
+
+    def _eval_dirname(self, text):
         logger.error("Tag 'dirname' not supported.")
@@ -0,0 +1,63 @@
+""" Analyze a launch tree under every combination of a set of argument values.
+
+Each launch file records which of its input arguments its evaluation read (see dependencies.py), so
+between combinations only the files whose dependencies changed value are re-evaluated; everything else
+is reused from an in-memory DependencyMemo.
+"""
+
+import logging
+import itertools
+from collections import OrderedDict
+
+import parser
+from dependencies import DependencyMemo
+
+logger = logging.getLogger(__name__)
+
+""" Parse sweep specifications of the form 'ARG:=VALUE1,VALUE2,...'.
+
+Returns:
+    An OrderedDict of argument name to the list of values to sweep over.
+"""
+def parse_sweep_arguments(specifications):
+    sweep_arguments = OrderedDict()
+    for specification in specifications:
+        if ":=" not in specification:
+            raise RuntimeError("Sweep arguments must follow format 'ARG:=VALUE1,VALUE2'; got '{}'".format(specification))
+        arg, values = specification.split(":=", 1)
+        sweep_arguments[arg] = values.split(",")
+    return sweep_arguments
+
+""" Build the graph of the given launch file for every combination of the sweep arguments.
+
+Args:
+    input_arguments:    Arguments common to all combinations.
+    sweep_arguments:    OrderedDict of argument name to the list of values it takes.
+
+Returns:
+    A list of (node names, combinations) tuples, one per distinct set of launched nodes in order of first
+    appearance, where combinations is the list of argument dicts which launch exactly those nodes.
+"""
+def sweep(filename, input_arguments, sweep_arguments, verbose=False, cache_dir=None):
+    parser.LaunchFile.initialize(cache_dir)
+    previous_memo = parser.LaunchFile.memo
+    parser.LaunchFile.memo = DependencyMemo()
+
+    results = OrderedDict()
+    try:
+        for values in itertools.product(*sweep_arguments.values()):
+            combination = OrderedDict(zip(sweep_arguments.keys(), values))
+            arguments = dict(input_arguments)
+            arguments.update(combination)
+
+            logger.info("Analyzing {} with arguments {}".format(filename, dict(combination)))
+            graph = parser.build_graph(filename, arguments, verbose, cache_dir)
+            nodes = frozenset(node.namespace + node.name for entry in graph.values() for node in entry["nodes"])
+            results.setdefault(nodes, []).append(dict(combination))
+
+        memo = parser.LaunchFile.memo
+        logger.info("Reused {} of {} launch file evaluations.".format(memo.hits, memo.hits + memo.misses))
+    finally:
+        parser.LaunchFile.memo = previous_memo
+
+    return [(sorted(nodes), combinations) for nodes, combinations in results.items()]
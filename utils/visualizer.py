@@ -1,76 +1,152 @@
 import re
-import copy
 import logging
-import plotly
-import chart_studio.plotly as py
+
+import renderers
 
 logger = logging.getLogger(__name__)
 
 class Visualizer:
-    def __init__(self, root_file, graph):
+    """ Sankey view of a launch file graph.
+
+    Args:
+        max_depth:      Only show launch files up to this include depth (the root file being depth 0).
+        min_size:       Only show launch files whose subtree spawns at least this many nodes.
+        hover_length:   Truncate hover text to this many characters; the full text is written to a separate
+                            details file when plotting, loaded when the link is clicked.
+
+    Launch files hidden by max_depth / min_size (and the nodes of files at max_depth) are aggregated into
+    one summary node per visible parent, so the figure's size scales with the visible levels.
+    """
+    def __init__(self, root_file, graph, max_depth=None, min_size=0, hover_length=None):
         self.graph = graph
         self.root_file = root_file
+        self.max_depth = max_depth
+        self.min_size = min_size
+        self.hover_length = hover_length
 
         # regexp expressions
         self.dict_pattern = re.compile(r"[{},]")
         self.xml_pattern = re.compile(r"\[|\(|\),|\]")
 
+        # full text of truncated hover labels, keyed by the index stored in the link's customdata
+        self.details = []
+
+        self.totals = None
         self.data, self.layout = self.get_config()
 
     def get_total_nodes(self, launch_file):
         # get the sum total of nodes + launch files spawned by the given launch file
-        def _count_children(launch_file):
-            # add nodes
-            my_offspring = len(self.graph[launch_file]["nodes"])
+        if self.totals is None:
+            self.totals = self.get_subtree_totals()
+        return self.totals[launch_file]
+
+    """ Count the nodes spawned by every launch file's subtree in a single post-order pass.
+    """
+    def get_subtree_totals(self):
+        return self._subtree_sums(lambda launch_file: len(self.graph[launch_file]["nodes"]))
+
+    """ Return the include depth of every launch file reachable from the root(s) of the graph.
+    """
+    def get_depths(self):
+        roots = [key for key, value in self.graph.items() if value["object"].parent is None]
+        depths = dict((root, 0) for root in roots)
+        queue = list(roots)
+        for launch_file in queue:
             for child in self.graph[launch_file]["object"].children:
-                my_offspring += _count_children(child)
-            return my_offspring
-        return _count_children(launch_file)
+                if child not in depths:
+                    depths[child] = depths[launch_file] + 1
+                    queue.append(child)
+        return depths
 
     """ Construct the dictionaries used by plotly to generate a Sankey graph.
     """
     def get_config(self):
+        self.totals = self.get_subtree_totals()
+        self.details = []
+        collapsing = self.max_depth is not None or self.min_size > 0
+        if collapsing:
+            file_totals = self._subtree_sums(lambda launch_file: 1)
+            depths = self.get_depths()
+            visible = lambda launch_file: depths.get(launch_file, 0) == 0 or (
+                (self.max_depth is None or depths[launch_file] <= self.max_depth) and self.totals[launch_file] >= self.min_size)
+        else:
+            visible = lambda launch_file: True
 
         # sankey object inputs (initialized with first launch file)
-        nodes = list(self.graph.keys())
-        node_colors = []
-        node_labels = []
-        node_hover_labels = []
+        nodes = [key for key in self.graph.keys() if visible(key)]
+        indices = dict((key, idx) for idx, key in enumerate(nodes))
+        node_colors = ["blue"] * len(nodes)
+        node_labels = [self.graph[key]["object"].name for key in nodes]
+        node_hover_labels = list(nodes)
         link_labels = []
+        link_details = []
         sources = []
         targets = []
         values = []
 
-        # build the sources / targets / labels / colors
-        for parent in nodes:
-            node_colors.append("blue")
-            node_labels.append(parent.split("/")[-1])
-            node_hover_labels.append(parent)
+        # number of (files, nodes) hidden under each visible parent
+        hidden = {}
 
+        # build the sources / targets / labels
+        for parent in list(nodes):
             # process all launch file children of this file
+            children = []
             for launch_file in self.graph[parent]["object"].children:
-                link_labels.append("<b>Input arguments from {} to {}: </b><br> {}".format(
-                    parent.split("/")[-1], 
-                    launch_file.split("/")[-1], 
+                if not visible(launch_file):
+                    hidden_files, hidden_nodes = hidden.get(parent, (0, 0))
+                    hidden[parent] = (hidden_files + file_totals[launch_file], hidden_nodes + self.totals[launch_file])
+                    continue
+                children.append(launch_file)
+                self._add_label(link_labels, link_details, "<b>Input arguments from {} to {}: </b><br> {}".format(
+                    self.graph[parent]["object"].name, 
+                    self.graph[launch_file]["object"].name, 
                     self.dict_pattern.sub("<br>", str(self.graph[launch_file]["object"].input_arguments))))
-                sources.append(nodes.index(parent))
-                targets.append(nodes.index(launch_file))
-                values.append(self.get_total_nodes(launch_file))
+            sources.extend([indices[parent]] * len(children))
+            targets.extend(indices[launch_file] for launch_file in children)
+            values.extend(self.totals[launch_file] for launch_file in children)
+
+        for key in list(nodes):
+            value = self.graph[key]
+            # the nodes of files at the depth limit are summarized along with their hidden children
+            if collapsing and self.max_depth is not None and depths.get(key, 0) >= self.max_depth:
+                if value["nodes"]:
+                    hidden_files, hidden_nodes = hidden.get(key, (0, 0))
+                    hidden[key] = (hidden_files, hidden_nodes + len(value["nodes"]))
+                continue
 
-        for key, value in self.graph.items():
             # process all node children of this file:
+            first = len(nodes)
             for node in value["nodes"]:
                 nodes.append(node.namespace + node.name)
-                node_colors.append("red")
                 node_labels.append(node.name)
                 node_hover_labels.append("Node {}".format(nodes[-1]))
-                link_labels.append("<b>Node {} launched from {}:</b><br>{}".format(
+                self._add_label(link_labels, link_details, "<b>Node {} launched from {}:</b><br>{}".format(
                     node.name.split("/")[-1],
-                    key.split("/")[-1], 
+                    value["object"].name, 
                     self.xml_pattern.sub("<br>", str(node.xmlattrs()))))
-                sources.append(nodes.index(key))
-                targets.append(len(nodes)-1)
-                values.append(1)
+            count = len(nodes) - first
+            node_colors.extend(["red"] * count)
+            sources.extend([indices[key]] * count)
+            targets.extend(range(first, len(nodes)))
+            values.extend([1] * count)
+
+        # one summary node per parent standing in for everything hidden beneath it
+        for key, (hidden_files, hidden_nodes) in hidden.items():
+            nodes.append(key + "/...")
+            node_colors.append("grey")
+            node_labels.append("{} launch files, {} nodes".format(hidden_files, hidden_nodes))
+            node_hover_labels.append("Collapsed contents of {}".format(key))
+            self._add_label(link_labels, link_details, "<b>Collapsed contents of {}</b>".format(self.graph[key]["object"].name))
+            sources.append(indices[key])
+            targets.append(len(nodes) - 1)
+            values.append(hidden_nodes)
+
+        # plotly accepts numpy arrays directly, which are much cheaper to serialize than lists
+        numpy = _import_numpy()
+        if numpy is not None:
+            sources = numpy.array(sources, dtype=numpy.int64)
+            targets = numpy.array(targets, dtype=numpy.int64)
+            values = numpy.array(values, dtype=numpy.int64)
 
         data=dict(
             type='sankey',
@@ -86,6 +162,8 @@ class Visualizer:
                 target=targets,
                 label=link_labels,
                 value=values))
+        if self.details:
+            data["link"]["customdata"] = link_details
 
         layout=dict(
             title="Launchalyzer view of {}".format(self.root_file.split("/")[-1]),
@@ -94,6 +172,55 @@ class Visualizer:
 
         return data, layout
 
-    def plot(self):
-        fig = dict(data=[self.data], layout=self.layout)
-        plotly.offline.plot(fig, validate=False)
+    """ Plot the graph to the given HTML file with plotly.
+
+    If any hover labels were truncated, their full text is written next to it (FILENAME.details.js) and
+    loaded by the page when a link is clicked.
+    """
+    def plot(self, filename="temp-plot.html", auto_open=True):
+        self.render(renderers.PlotlyRenderer(auto_open), filename)
+
+    """ Write the graph to the given file with the given renderer (see renderers.py).
+    """
+    def render(self, renderer, filename=None):
+        renderer.render(self, filename or renderer.DEFAULT_FILENAME)
+
+    #------------------------------------- INTERNAL FUNCTIONS ------------------------------------#
+
+    def _add_label(self, labels, details, label):
+        # truncate long labels, keeping the full text to be loaded on demand
+        if self.hover_length is None or len(label) <= self.hover_length:
+            labels.append(label)
+            details.append(-1)
+            return
+        labels.append(label[:self.hover_length] + "...<br><i>(click for details)</i>")
+        details.append(len(self.details))
+        self.details.append(label)
+
+    def _subtree_sums(self, value):
+        # sum value(launch_file) over every launch file's subtree, in a single iterative post-order pass
+        totals = {}
+        for launch_file in self.graph.keys():
+            if launch_file in totals:
+                continue
+            # a file is totalled once all of its children are
+            stack = [(launch_file, False)]
+            while stack:
+                current, expanded = stack.pop()
+                if current in totals:
+                    continue
+                children = self.graph[current]["object"].children
+                if expanded:
+                    totals[current] = value(current) + sum(totals[child] for child in children)
+                    continue
+                stack.append((current, True))
+                stack.extend((child, False) for child in children if child not in totals)
+        return totals
+
+def _import_numpy():
+    # numpy is optional, and slow to import, so it's only loaded once a config is built
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
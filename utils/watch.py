@@ -0,0 +1,75 @@
+""" Keep a launch tree's analysis up to date while its files are being edited.
+
+The files of the current graph are polled for changes. When any of them change, only their memoized
+evaluations are dropped before rebuilding: every other file is reused from an in-memory DependencyMemo
+unless its inputs (arguments it depends on, or namespace) changed as a result, so only the edited files and
+the descendants they actually affect are re-evaluated.
+"""
+
+import os
+import time
+import logging
+
+import parser
+from dependencies import DependencyMemo
+
+logger = logging.getLogger(__name__)
+
+""" Return the (mtime, size) of the given file, or None if it can't be read.
+"""
+def signature(path):
+    try:
+        status = os.stat(path)
+    except OSError:
+        return None
+    return (status.st_mtime, status.st_size)
+
+""" Block until any of the given files' signatures differ from those given, returning the changed files.
+"""
+def wait_for_changes(signatures, interval=1.0):
+    while True:
+        time.sleep(interval)
+        changed = [path for path, previous in signatures.items() if signature(path) != previous]
+        if changed:
+            return changed
+
+""" Build the graph of the given launch file, then rebuild it whenever any of its files change.
+
+Args:
+    on_update:  Called with each successfully built graph.
+    interval:   Seconds between polls of the files' modification times.
+
+Runs until interrupted. Builds are always done in this process (jobs=1), since the memo isn't shared
+with worker processes.
+"""
+def watch(filename, input_arguments, on_update, interval=1.0, verbose=False, cache_dir=None, full_params=False):
+    parser.LaunchFile.initialize(cache_dir)
+    previous_memo = parser.LaunchFile.memo
+    memo = parser.LaunchFile.memo = DependencyMemo()
+
+    paths = set([filename])
+    try:
+        while True:
+            signatures = dict((path, signature(path)) for path in paths)
+            misses = memo.misses
+            try:
+                graph = parser.build_graph(filename, input_arguments, verbose, cache_dir, 1, full_params)
+            except parser.BUILD_ERRORS as error:
+                logger.error("Failed to analyze {}: {}".format(filename, error))
+                # e.g. a file saved mid-edit; keep watching everything evaluated so far, including the file that failed
+                paths.update(path for path, _ in memo.entries.keys())
+            else:
+                logger.info("Evaluated {} of {} launch files.".format(memo.misses - misses, len(graph)))
+                paths = set(entry["object"].fullpath for entry in graph.values())
+                paths.add(filename)
+                on_update(graph)
+
+            for path in paths - set(signatures.keys()):
+                signatures[path] = signature(path)
+
+            logger.info("Watching {} launch files for changes.".format(len(signatures)))
+            for path in wait_for_changes(signatures, interval):
+                logger.info("{} changed.".format(path))
+                memo.discard(path)
+    finally:
+        parser.LaunchFile.memo = previous_memo